@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from scripts import forecast_pipeline as fp
+from scripts import precompute as pc
+from scripts import tracing
+import os
 import plotly.express as px
 
 
@@ -13,6 +16,162 @@ import plotly.express as px
 # to the total sales over a 10-day period using interactive Plotly charts.
 
 
+@st.cache_resource
+def register_exporters():
+    """
+    Exports the stage timings of every live forecast when a trace or metrics file is configured.
+    Cached so the exporters are registered once per server process and not on every script rerun.
+    """
+    if os.getenv("FORECAST_TRACE_PATH"):
+        tracing.register_exporter(tracing.jsonl_exporter(os.getenv("FORECAST_TRACE_PATH")))
+    if os.getenv("FORECAST_METRICS_PATH"):
+        tracing.register_exporter(tracing.prometheus_exporter(os.getenv("FORECAST_METRICS_PATH")))
+
+
+register_exporters()
+
+
+# Display label of each forecast column
+SALES_LABELS = {
+    "Total": "Total Sales",
+    "Coffee": "Coffee Sales",
+    "Without Coffee": "Without Coffee Beverages Sales",
+    "Food": "Food Sales",
+}
+
+
+# Cached Models and Forecasts
+
+@st.cache_resource
+def load_models():
+    """
+    Loads every category model once per server process.
+    Returns:
+        dict: The trained model of each sales category
+    """
+    return {category: fp.load_sales_model(path) for category, path in fp.SALES_MODELS.items()}
+
+
+@st.cache_resource
+def load_forecast_table():
+    """
+    Loads the precomputed forecasts of the valid forecast window once per server process.
+    Returns:
+        pandas.DataFrame: The precomputed forecast table or None if it has not been built
+    """
+    return pc.load_forecast_table()
+
+
+@st.cache_data(show_spinner=False)
+def run_forecast(date, ped_start, ped_end, closed_dates):
+    """
+    Predicts every sales category, reading precomputed scenarios from the forecast table
+    and running the forecast pipeline live otherwise.
+    Results are cached so reruns with the same inputs skip the feature fetches.
+    Args:
+        date (str): The forecast start date
+        ped_start (str): Pedestrianization start date
+        ped_end (str): Pedestrianization end date
+        closed_dates (tuple): Dates when the store is closed
+    Returns:
+        pandas.DataFrame: The (days x categories) predictions with a Total column
+        pandas.DataFrame: The stage timings of the run
+    """
+    tracing.start_trace()
+    try:
+        with tracing.span("forecast_table_lookup") as record:
+            predictions = pc.lookup_forecast(load_forecast_table(), date, pc.scenario_name(ped_start, ped_end, closed_dates))
+            record["cache"] = "miss" if predictions is None else "hit"
+
+        if predictions is None:
+            X, dates = fp.forecast_matrix(date, ped_start, ped_end, closed_dates=list(closed_dates) if closed_dates else None)
+            models = load_models()
+            predictions = pd.DataFrame({category: fp.predict_matrix(model, X)
+                                        for category, model in models.items()}, index=dates.date)
+    finally:
+        spans = tracing.end_trace()
+
+    predictions.insert(0, "Total", predictions.sum(axis=1))
+
+    return predictions, pd.DataFrame(spans, columns=["stage", "wall_time", "cache", "rows"])
+
+
+# Summary Statistics and Charts
+
+def summary_stats(predictions):
+    """
+    Computes the summary statistics of every column in one pass over the predictions matrix.
+    Args:
+        predictions (pandas.DataFrame): The (days x categories) predictions
+    Returns:
+        pandas.DataFrame: Mean, sum, min and max (with their dates) per column
+    """
+    values = predictions.to_numpy()
+    min_pos = values.argmin(axis=0)
+    max_pos = values.argmax(axis=0)
+    columns = range(values.shape[1])
+
+    return pd.DataFrame({
+        "mean": values.mean(axis=0),
+        "sum": values.sum(axis=0),
+        "min": values[min_pos, columns],
+        "max": values[max_pos, columns],
+        "idxmin": predictions.index[min_pos],
+        "idxmax": predictions.index[max_pos],
+    }, index=predictions.columns)
+
+
+def sales_line_chart(sales, stats, yaxis_title):
+    """
+    Builds the line chart of a sales forecast with its mean, min and max highlighted.
+    Args:
+        sales (pandas.Series): The forecasted sales indexed by date
+        stats (pandas.Series): The summary statistics of the series
+        yaxis_title (str): The y axis title
+    Returns:
+        plotly.graph_objects.Figure: The line chart
+    """
+    fig = px.line(sales.to_frame("sales"), markers=True)
+    # Add a dashed horizontal line showing the mean sales
+    fig.add_hline(y=stats["mean"],
+                  line_dash="dash",
+                  annotation_position="top right",
+                  line_color='dodgerblue',
+                  annotation_text=f'Mean Sales: {stats["mean"]:.2f}')
+
+    # Add scatter markers to highlight the min and max sales points
+    for name, index, value in [("Min Sales", stats["idxmin"], stats["min"]),
+                               ("Max Sales", stats["idxmax"], stats["max"])]:
+        fig.add_scatter(
+            x=[index],
+            y=[value],
+            mode='markers',
+            marker=dict(color='dodgerblue', size=8),
+            name=name
+        )
+
+    fig.update_layout(xaxis_title="Date", yaxis_title=yaxis_title)
+    return fig
+
+
+def render_sales_section(column, predictions, stats):
+    """
+    Displays the chart and data table of one forecast column.
+    Args:
+        column (str): The predictions column to display
+        predictions (pandas.DataFrame): The (days x categories) predictions
+        stats (pandas.DataFrame): The summary statistics of the predictions
+    """
+    label = SALES_LABELS[column]
+    st.subheader(f"{label} Predictions")
+    # Create two columns: one for the chart and one for the data table
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        st.plotly_chart(sales_line_chart(predictions[column], stats.loc[column], label))
+    with col2:
+        st.dataframe(predictions[column].to_frame("sales"), width=200)
+
+
 # Set the title of the dashboard
 st.title("Cafe Sales Dashboard")
 
@@ -21,242 +180,72 @@ st.title("Cafe Sales Dashboard")
 st.sidebar.header("User Inputs")
 
 # User selects the forecast start date with a default and a maximum value
-date = st.sidebar.date_input("Select Forecast Start Date", datetime(2024, 12, 1), max_value=datetime(2025, 1, 21))
-print(type(date))
+date = st.sidebar.date_input("Select Forecast Start Date",
+                             datetime.strptime(pc.FORECAST_WINDOW[0], "%Y-%m-%d"),
+                             max_value=datetime.strptime(pc.FORECAST_WINDOW[1], "%Y-%m-%d"))
 
 # User selects pedestrianization start and end dates (may impact the forecast model)
-ped_start = st.sidebar.date_input("Pedestrianization Start Date", datetime(2025, 6, 1))
-ped_end = st.sidebar.date_input("Pedestrianization End Date", datetime(2025, 6, 10))
+default_scenario = pc.DEFAULT_SCENARIOS["default"]
+ped_start = st.sidebar.date_input("Pedestrianization Start Date", datetime.strptime(default_scenario["ped_start"], "%Y-%m-%d"))
+ped_end = st.sidebar.date_input("Pedestrianization End Date", datetime.strptime(default_scenario["ped_end"], "%Y-%m-%d"))
 
 # Input for dates when the store is closed (comma separated, format: YYYY-MM-DD)
 closed_dates = st.sidebar.text_input("Enter Closed Dates (comma separated, YYYY-MM-DD)", "")
 
 # Process the closed dates input: split by comma and strip whitespace, if provided
 if closed_dates:
-    closed_dates = [date.strip() for date in closed_dates.split(",")]
+    closed_dates = tuple(date.strip() for date in closed_dates.split(","))
 else:
     closed_dates = None
 
+# Optional panel with the time spent in each pipeline stage
+show_timings = st.sidebar.checkbox("Show stage timings", False)
+
 # Button to trigger running the forecast
-run_forecast = st.button("Run Forecast")
+if st.button("Run Forecast"):
+    # Keep the inputs of the last run so later widget interactions redisplay it from the cache
+    st.session_state["forecast_inputs"] = (date.strftime("%Y-%m-%d"),
+                                           ped_start.strftime("%Y-%m-%d"),
+                                           ped_end.strftime("%Y-%m-%d"),
+                                           closed_dates)
 
 # Forecast Execution and Visualization
-if run_forecast:
+if "forecast_inputs" in st.session_state:
     with st.spinner("Running forecast, please wait..."):
         try:
-            # Data Preparation using the Forecast Pipeline
-            # The pipeline prepares the input data based on the selected dates and closed dates
-            data = fp.forecast_pipe(date.strftime("%Y-%m-%d"), 
-                                      ped_start.strftime("%Y-%m-%d"), 
-                                      ped_end.strftime("%Y-%m-%d"), 
-                                      closed_dates=closed_dates)
-
-            # Generate Predictions for Each Sales Category
-            predictions_cat1 = fp.load_sales_model_and_forecast("sales_models/xgb_model_Coffee.pkl", data, date)
-            predictions_cat2 = fp.load_sales_model_and_forecast("sales_models/xgb_model_Without_Coffee.pkl", data, date)
-            predictions_cat3 = fp.load_sales_model_and_forecast("sales_models/xgb_model_Food.pkl", data, date)
-
-            # Calculate total predictions by summing forecasts from all categories
-            total_predictions = predictions_cat1 + predictions_cat2 + predictions_cat3
-            
+            predictions, timings = run_forecast(*st.session_state["forecast_inputs"])
+            stats = summary_stats(predictions)
+
+            if show_timings:
+                # Timings are the ones of the run that produced the (possibly cached) results
+                with st.expander("Stage Timings", expanded=True):
+                    st.dataframe(timings.rename(columns={"wall_time": "wall time (s)"}), hide_index=True)
+
             # Display Total Sales Predictions
-            st.subheader("Total Sales Predictions")
-            # Create two columns: one for the chart and one for the data table
-            col1, col2 = st.columns([2,1])
-            with col1:
-                # Create a line chart for total predictions with markers
-                fig_total = px.line(total_predictions, markers=True)
-                mean_sales_total = total_predictions["sales"].mean()
-                # Add a dashed horizontal line showing the mean sales
-                fig_total.add_hline(y=mean_sales_total, 
-                                    line_dash="dash", 
-                                    annotation_position="top right", 
-                                    line_color='dodgerblue', 
-                                    annotation_text=f'Mean Sales: {mean_sales_total:.2f}')
-
-                # Compute the indices and values of the minimum and maximum sales
-                min_index_total = total_predictions["sales"].idxmin()
-                max_index_total = total_predictions["sales"].idxmax()
-                min_value_total = total_predictions["sales"].min()
-                max_value_total = total_predictions["sales"].max()
-                
-                # Add scatter markers to highlight the min and max sales points
-                fig_total.add_scatter(
-                    x=[min_index_total],
-                    y=[min_value_total],
-                    mode='markers',
-                    marker=dict(color='dodgerblue', size=8),
-                    name='Min Sales'
-                )
-                fig_total.add_scatter(
-                    x=[max_index_total],
-                    y=[max_value_total],
-                    mode='markers',
-                    marker=dict(color='dodgerblue', size=8),
-                    name='Max Sales'
-                )
-                
-                # Set axis titles for clarity
-                fig_total.update_layout(xaxis_title="Date", yaxis_title="Total Sales")
-                st.plotly_chart(fig_total)
-            with col2:
-                # Show the total predictions in a small data table
-                st.dataframe(total_predictions, width=200)
+            render_sales_section("Total", predictions, stats)
 
             # Display Sales Contribution by Category (Histogram)
             st.subheader("Sales Contribution by Category")
-            
+
             # Calculate the percentage contribution of each category to total sales
-            coffee_contribution = predictions_cat1["sales"].sum() / total_predictions["sales"].sum() * 100
-            without_coffee_contribution = predictions_cat2["sales"].sum() / total_predictions["sales"].sum() * 100
-            food_contribution = predictions_cat3["sales"].sum() / total_predictions["sales"].sum() * 100
-            
-            # Create a DataFrame summarizing the contributions
+            categories = list(fp.SALES_MODELS)
             contributions = pd.DataFrame({
-                "Category": ["Coffee Sales", "Without Coffee Beverages Sales", "Food Sales"],
-                "Contribution (%)": [coffee_contribution, without_coffee_contribution, food_contribution]
+                "Category": [SALES_LABELS[category] for category in categories],
+                "Contribution (%)": (stats.loc[categories, "sum"] / stats.loc["Total", "sum"] * 100).to_numpy()
             })
-            
+
             # Create a bar chart to display the contribution percentages
             fig_contrib = px.bar(contributions, x="Category", y="Contribution (%)", text="Contribution (%)")
             # Format the labels to show percentages with two decimal places and add a percent sign
             fig_contrib.update_traces(texttemplate='%{text:.2f}%', textposition='outside', width=0.5)
-            fig_contrib.update_layout(title="Category Contribution to Total Sales", 
-                                      xaxis_title="Category", 
+            fig_contrib.update_layout(title="Category Contribution to Total Sales",
+                                      xaxis_title="Category",
                                       yaxis_title="Contribution (%)")
             st.plotly_chart(fig_contrib)
 
-            # Display Coffee Sales Predictions
-            st.subheader("Coffee Sales Predictions")
-            col1, col2 = st.columns([2,1])
-            with col1:
-                # Prepare a DataFrame for coffee sales
-                df_cat1 = pd.DataFrame(predictions_cat1, columns=["sales"])
-                # Create the line chart for coffee sales
-                fig1 = px.line(df_cat1, markers=True)
-                mean_sales_cat1 = df_cat1["sales"].mean()
-                # Add a horizontal line for the mean coffee sales
-                fig1.add_hline(y=mean_sales_cat1, 
-                               line_dash="dash", 
-                               annotation_position="top right", 
-                               line_color='dodgerblue', 
-                               annotation_text=f'Mean Sales: {mean_sales_cat1:.2f}')
-
-                # Compute min and max for coffee sales
-                min_index_cat1 = df_cat1["sales"].idxmin()
-                max_index_cat1 = df_cat1["sales"].idxmax()
-                min_value_cat1 = df_cat1["sales"].min()
-                max_value_cat1 = df_cat1["sales"].max()
-                
-                # Highlight the min and max points
-                fig1.add_scatter(
-                    x=[min_index_cat1],
-                    y=[min_value_cat1],
-                    mode='markers',
-                    marker=dict(color='dodgerblue', size=8),
-                    name='Min Sales'
-                )
-                fig1.add_scatter(
-                    x=[max_index_cat1],
-                    y=[max_value_cat1],
-                    mode='markers',
-                    marker=dict(color='dodgerblue', size=8),
-                    name='Max Sales'
-                )
-
-                fig1.update_layout(xaxis_title="Date", yaxis_title="Coffee Sales")
-                st.plotly_chart(fig1)
-            with col2:
-                # Show the coffee sales data in a table
-                st.dataframe(pd.DataFrame(predictions_cat1, columns=["sales"]), width=200)
-
-            # Display Without Coffee Beverages Sales Predictions
-            st.subheader("Without Coffee Beverages Sales Predictions")
-            col1, col2 = st.columns([2,1])
-            with col1:
-                # Prepare DataFrame for without coffee beverages sales
-                df_cat2 = pd.DataFrame(predictions_cat2, columns=["sales"])
-                # Create the line chart
-                fig2 = px.line(df_cat2, markers=True)
-                mean_sales_cat2 = df_cat2["sales"].mean()
-                # Add a horizontal line for the mean
-                fig2.add_hline(y=mean_sales_cat2, 
-                               line_dash="dash", 
-                               annotation_position="top right", 
-                               line_color='dodgerblue', 
-                               annotation_text=f'Mean Sales: {mean_sales_cat2:.2f}')
-
-                # Compute min and max values
-                min_index_cat2 = df_cat2["sales"].idxmin()
-                max_index_cat2 = df_cat2["sales"].idxmax()
-                min_value_cat2 = df_cat2["sales"].min()
-                max_value_cat2 = df_cat2["sales"].max()
-                
-                # Highlight the min and max sales
-                fig2.add_scatter(
-                    x=[min_index_cat2],
-                    y=[min_value_cat2],
-                    mode='markers',
-                    marker=dict(color='dodgerblue', size=8),
-                    name='Min Sales'
-                )
-                fig2.add_scatter(
-                    x=[max_index_cat2],
-                    y=[max_value_cat2],
-                    mode='markers',
-                    marker=dict(color='dodgerblue', size=8),
-                    name='Max Sales'
-                )
-
-                fig2.update_layout(xaxis_title="Date", yaxis_title="Without Coffee Beverages Sales")
-                st.plotly_chart(fig2)
-            with col2:
-                # Display without coffee beverages sales data in a table
-                st.dataframe(pd.DataFrame(predictions_cat2, columns=["sales"]), width=200)
-
-            # Display Food Sales Predictions
-            st.subheader("Food Sales Predictions")
-            col1, col2 = st.columns([2,1])
-            with col1:
-                # Create a DataFrame for food sales predictions
-                df_cat3 = pd.DataFrame(predictions_cat3, columns=["sales"])
-                # Generate a line chart for food sales
-                fig3 = px.line(df_cat3, markers=True)
-                mean_sales_cat3 = df_cat3["sales"].mean()
-                # Add a horizontal line for the mean
-                fig3.add_hline(y=mean_sales_cat3, 
-                               line_dash="dash", 
-                               annotation_position="top right", 
-                               line_color='dodgerblue', 
-                               annotation_text=f'Mean Sales: {mean_sales_cat3:.2f}')
-
-                # Compute and annotate min and max values
-                min_index_cat3 = df_cat3["sales"].idxmin()
-                max_index_cat3 = df_cat3["sales"].idxmax()
-                min_value_cat3 = df_cat3["sales"].min()
-                max_value_cat3 = df_cat3["sales"].max()
-                
-                # Highlight min and max points
-                fig3.add_scatter(
-                    x=[min_index_cat3],
-                    y=[min_value_cat3],
-                    mode='markers',
-                    marker=dict(color='dodgerblue', size=8),
-                    name='Min Sales'
-                )
-                fig3.add_scatter(
-                    x=[max_index_cat3],
-                    y=[max_value_cat3],
-                    mode='markers',
-                    marker=dict(color='dodgerblue', size=8),
-                    name='Max Sales'
-                )
-
-                fig3.update_layout(xaxis_title="Date", yaxis_title="Food Sales")
-                st.plotly_chart(fig3)
-            with col2:
-                # Display food sales predictions data
-                st.dataframe(pd.DataFrame(predictions_cat3, columns=["sales"]), width=200)
+            # Display the predictions of each category
+            for category in categories:
+                render_sales_section(category, predictions, stats)
 
         except Exception as e:
             # If any error occurs, display it in the app
@@ -0,0 +1,194 @@
+# Description: This file contains the content-addressed store of training artifacts. Trained models and their metrics are
+# keyed by a hash of the training frame, the features, the parameter grid and the library versions, so unchanged
+# retrains are served from the store and every published model file has a recorded lineage.
+
+import hashlib
+import inspect
+import json
+import os
+import platform
+from datetime import datetime
+import dill
+import numpy as np
+import pandas as pd
+import sklearn
+import xgboost
+
+ARTIFACT_DIR = os.path.join('sales_models', 'artifacts')
+LINEAGE_FILE = 'lineage.json'
+
+# Keys
+# ------------------------------------------------------------------------------
+def library_versions() -> dict:
+    """
+    Versions of the libraries that affect the trained models.
+    Returns:
+        dict: Library name -> version
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__,
+        'xgboost': xgboost.__version__
+    }
+
+
+def artifact_key(df, features, params) -> str:
+    """
+    Hashes everything a training run depends on.
+    Parameters:
+        df (pandas.DataFrame): The training frame (features and targets)
+        features (list): The feature columns
+        params (dict): The training configuration (parameter grid, estimator, splits, seeds, ...)
+    Returns:
+        str: The artifact key
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(json.dumps({
+        'columns': list(df.columns),
+        'features': list(features),
+        'params': params,
+        'versions': library_versions()
+    }, sort_keys=True, default=str).encode('utf-8'))
+
+    return digest.hexdigest()[:24]
+
+
+def estimator_fingerprint(estimator_factory) -> dict:
+    """
+    Identifies an estimator factory by its name and a hash of its source, so editing the factory body
+    (e.g. a new default hyperparameter) changes the artifact key.
+    Parameters:
+        estimator_factory (callable): The factory of the training run
+    Returns:
+        dict: The qualified name and the source hash of the factory
+    """
+    try:
+        source = inspect.getsource(estimator_factory).encode('utf-8')
+    except (OSError, TypeError):
+        # Factories without a source file (e.g. defined in an interactive session) are hashed by their bytecode
+        code = estimator_factory.__code__
+        source = code.co_code + repr(code.co_consts).encode('utf-8')
+
+    return {
+        'estimator': f"{estimator_factory.__module__}.{estimator_factory.__qualname__}",
+        'estimator_source': hashlib.sha256(source).hexdigest()[:16]
+    }
+
+# Store
+# ------------------------------------------------------------------------------
+def load_artifact(key, root=ARTIFACT_DIR):
+    """
+    Loads a stored training artifact.
+    Parameters:
+        key (str): The artifact key
+        root (str): The artifact store directory
+    Returns:
+        The stored artifact or None if the key is not in the store
+    """
+    path = os.path.join(root, key, 'artifact.pkl')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return dill.load(f)
+
+
+def save_artifact(key, artifact, metadata=None, root=ARTIFACT_DIR):
+    """
+    Stores a training artifact with its lineage metadata.
+    Parameters:
+        key (str): The artifact key
+        artifact: The object to store (e.g. results, summary_df, residuals, best_models)
+        metadata (dict, optional): Lineage information saved next to the artifact
+        root (str): The artifact store directory
+    Returns:
+        str: The artifact directory
+    """
+    directory = os.path.join(root, key)
+    os.makedirs(directory, exist_ok=True)
+
+    # Write then rename so an interrupted run never leaves a readable partial artifact
+    tmp_path = os.path.join(directory, 'artifact.pkl.tmp')
+    with open(tmp_path, 'wb') as f:
+        dill.dump(artifact, f)
+    os.replace(tmp_path, os.path.join(directory, 'artifact.pkl'))
+
+    with open(os.path.join(directory, 'metadata.json'), 'w', encoding='utf-8') as f:
+        json.dump({'key': key, 'created': datetime.now().isoformat(), 'versions': library_versions(),
+                   **(metadata or {})}, f, indent=2, default=str)
+
+    return directory
+
+# Published models
+# ------------------------------------------------------------------------------
+def write_model(model, path):
+    """
+    Writes a model file atomically (write then rename) so the dashboard never loads a partial file.
+    Parameters:
+        model: The trained model
+        path (str): The model path
+    """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        dill.dump(model, f)
+    os.replace(tmp_path, path)
+
+
+def read_lineage(model_path) -> dict:
+    """
+    Reads the lineage entry of a published model file.
+    Parameters:
+        model_path (str): The model path, e.g. sales_models/xgb_model_Coffee.pkl
+    Returns:
+        dict: The lineage entry, None if the file has no recorded lineage
+    """
+    lineage_path = os.path.join(os.path.dirname(model_path), LINEAGE_FILE)
+    if not os.path.exists(lineage_path):
+        return None
+    with open(lineage_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get(os.path.basename(model_path))
+
+
+def record_lineage(entries, directory='sales_models'):
+    """
+    Adds or replaces entries of the lineage file of a model directory.
+    Parameters:
+        entries (dict): Model file name -> lineage entry
+        directory (str): The model directory
+    """
+    lineage_path = os.path.join(directory, LINEAGE_FILE)
+    lineage = {}
+    if os.path.exists(lineage_path):
+        with open(lineage_path, 'r', encoding='utf-8') as f:
+            lineage = json.load(f)
+    lineage.update(entries)
+
+    tmp_path = f'{lineage_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(lineage, f, indent=2, default=str)
+    os.replace(tmp_path, lineage_path)
+
+
+def publish_models(best_models, key, directory='sales_models', prefix='xgb_model'):
+    """
+    Writes trained models to the model directory (e.g. sales_models/xgb_model_Coffee.pkl) and records
+    the artifact key each file comes from in the directory lineage file.
+    Parameters:
+        best_models (dict): Category -> trained model
+        key (str): The artifact key of the training run
+        directory (str): The model directory
+        prefix (str): The model file prefix
+    Returns:
+        dict: Category -> model path
+    """
+    paths, entries = {}, {}
+    for category, model in best_models.items():
+        file_name = f"{prefix}_{category.replace(' ', '_')}.pkl"
+        paths[category] = os.path.join(directory, file_name)
+        write_model(model, paths[category])
+        entries[file_name] = {'artifact': key, 'category': category, 'published': datetime.now().isoformat()}
+
+    record_lineage(entries, directory)
+    return paths
@@ -0,0 +1,130 @@
+# Description: This file contains the headless feature attribution of the trained sales models. The per-feature
+# contribution of every prediction is computed in batch with XGBoost's native pred_contribs (exact TreeSHAP) on the
+# models in sales_models/, cached next to each model, and returned as arrays; plotting is left to scripts/visuals.py.
+
+import hashlib
+import os
+import warnings
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from scripts import forecast_pipeline as fp
+from scripts import tracing
+
+# Name of the contribution column holding the model bias (expected log1p sales)
+BIAS = 'bias'
+
+# Contributions
+# ------------------------------------------------------------------------------
+def contributions(model, X) -> np.ndarray:
+    """
+    Computes the contribution of every feature to every prediction of a log-target XGBoost pipeline.
+    Contributions are on the log1p scale of the model: each row sums to log1p of the predicted sales.
+    Parameters:
+        model (sklearn.pipeline.Pipeline): The trained model, checked with forecast_pipeline.check_feature_schema
+        X (numpy.ndarray): The (rows x features) feature array in FEATURE_ORDER
+    Returns:
+        numpy.ndarray: The (rows x features + 1) float32 contributions, the last column is the bias
+    """
+    Xt = np.asarray(X, dtype=np.float32)
+    with warnings.catch_warnings():
+        # The schema was checked at load time, the array has no feature names by design (see predict_matrix)
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+        for _, step in model.steps[:-1]:
+            Xt = step.transform(Xt)
+
+    booster = model.steps[-1][1].regressor_.get_booster()
+    with tracing.span('attribution', rows=len(Xt)):
+        return booster.predict(xgb.DMatrix(Xt), pred_contribs=True).astype(np.float32)
+
+
+def _cache_path(model_path, X):
+    """
+    Path of the cached contributions of a model file and a feature array.
+    The key covers the model file bytes, so retrained models never reuse stale contributions.
+    Parameters:
+        model_path (str): Path to the pickled dilled model
+        X (numpy.ndarray): The feature array
+    Returns:
+        str: The cache file path, in a '<model>_contribs' directory next to the model
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(str(X.shape).encode('utf-8'))
+    digest.update(X.tobytes())
+
+    return os.path.join(os.path.splitext(model_path)[0] + '_contribs', digest.hexdigest()[:24] + '.npy')
+
+
+def cached_contributions(model_path, X, model=None) -> np.ndarray:
+    """
+    Reads the contributions of a model file from its cache, computing and caching them on a miss.
+    Parameters:
+        model_path (str): Path to the pickled dilled model
+        X (numpy.ndarray): The (rows x features) feature array in FEATURE_ORDER
+        model (sklearn.pipeline.Pipeline, optional): The already loaded model
+    Returns:
+        numpy.ndarray: The (rows x features + 1) float32 contributions, see contributions
+    """
+    path = _cache_path(model_path, X)
+    if os.path.exists(path):
+        return np.load(path)
+
+    if model is None:
+        model = fp.load_sales_model(model_path)
+    values = contributions(model, X)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, values)
+    return values
+
+# Explanations
+# ------------------------------------------------------------------------------
+def explain(X, model_paths=fp.SALES_MODELS, models=None, cache=True) -> dict:
+    """
+    Explains every prediction of every category model in one batch.
+    Parameters:
+        X (numpy.ndarray or pandas.DataFrame): The (rows x features) features, e.g. from forecast_matrix
+        model_paths (dict): Category -> model path
+        models (dict, optional): Category -> already loaded model
+        cache (bool): Read and write the contribution cache next to each model
+    Returns:
+        dict: 'contributions' (categories x rows x features + 1 float32 array on the log1p scale),
+              'categories' and 'features' (FEATURE_ORDER followed by the bias)
+    """
+    if isinstance(X, pd.DataFrame):
+        X = X[fp.FEATURE_ORDER].to_numpy(dtype=np.float32)
+    models = models or {}
+
+    values = []
+    for category, path in model_paths.items():
+        if cache:
+            values.append(cached_contributions(path, X, model=models.get(category)))
+        else:
+            values.append(contributions(models.get(category) or fp.load_sales_model(path), X))
+
+    return {'contributions': np.stack(values), 'categories': list(model_paths), 'features': fp.FEATURE_ORDER + [BIAS]}
+
+
+def feature_importance(explanation) -> pd.DataFrame:
+    """
+    Global importance of every feature: the mean absolute contribution over the explained predictions.
+    Parameters:
+        explanation (dict): Output of explain
+    Returns:
+        pandas.DataFrame: 'feature', 'importance' and 'category' rows sorted by importance in each category,
+                          with an 'Overall' category averaging the categories
+    """
+    importance = np.abs(explanation['contributions'][:, :, :-1]).mean(axis=1)
+    importance = np.vstack([importance, importance.mean(axis=0)])
+
+    frame = pd.DataFrame(importance, index=explanation['categories'] + ['Overall'],
+                         columns=explanation['features'][:-1])
+    frame = frame.rename_axis('category').reset_index().melt(id_vars='category', var_name='feature',
+                                                               value_name='importance')
+    frame['category'] = pd.Categorical(frame['category'], categories=explanation['categories'] + ['Overall'])
+
+    return (frame.sort_values(['category', 'importance'], ascending=[True, False])
+            [['feature', 'importance', 'category']].reset_index(drop=True))
@@ -0,0 +1,162 @@
+# Description: This file contains the rolling-origin backtesting engine. Models are refit (or re-scored) at many forecast
+# origins and the 1..H-step errors of every category are collected in an (origin x horizon x category) error cube.
+
+import os
+import shutil
+import tempfile
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, cpu_count
+from threadpoolctl import threadpool_limits
+from scripts import model_training as mt
+
+# Backtest
+# ------------------------------------------------------------------------------
+def _origin_positions(dates, origins, min_train=1):
+    """
+    Finds the row of the last date on or before each origin.
+    Parameters:
+        dates (pandas.DatetimeIndex): Sorted dates of the feature matrix
+        origins (list): Forecast origin dates
+        min_train (int): Minimum number of rows on or before an origin
+    Returns:
+        numpy.ndarray: Row position of every origin
+    Raises:
+        ValueError: If an origin is outside the data range (no forecasted day after it) or has fewer
+                    than min_train rows of history.
+    """
+    origins = pd.to_datetime(origins)
+    outside = origins[(origins < dates[0]) | (origins >= dates[-1])]
+    if len(outside):
+        raise ValueError(f"Origins outside the data range {dates[0].date()} - {dates[-1].date()}: "
+                         f"{[str(origin.date()) for origin in outside]}")
+
+    positions = dates.searchsorted(origins, side='right') - 1
+    short = origins[positions + 1 < min_train]
+    if len(short):
+        raise ValueError(f"Origins with fewer than {min_train} days of history: "
+                         f"{[str(origin.date()) for origin in short]}")
+
+    return positions
+
+
+def _refit_origin(X, Y, origin_pos, horizon, estimator_factory, params, random_state, n_threads):
+    """
+    Fits every category on the rows up to an origin and returns the errors of the next horizon days.
+    Runs inside a worker process on the shared read-only matrices.
+    Parameters:
+        X (numpy.ndarray): Features of every date (memory-mapped)
+        Y (numpy.ndarray): Targets of every date and category (memory-mapped)
+        origin_pos (int): Row of the origin date
+        horizon (int): Number of days forecasted after the origin
+        estimator_factory (callable): Estimator factory, see model_training.train_model_families
+        params (dict): Pipeline parameters of the fitted models
+        random_state (int): Seed of the estimators
+        n_threads (int): Thread budget of the worker
+    Returns:
+        numpy.ndarray: (horizon x categories) errors, NaN past the end of the data
+    """
+    errors = np.full((horizon, Y.shape[1]), np.nan, dtype=np.float32)
+    test = np.arange(origin_pos + 1, min(origin_pos + 1 + horizon, len(X)))
+    if len(test) == 0:
+        return errors
+
+    with threadpool_limits(limits=n_threads), warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        for c in range(Y.shape[1]):
+            model = mt.log_target_pipeline(estimator_factory(random_state, n_threads)).set_params(**params)
+            model.fit(X[:origin_pos + 1], Y[:origin_pos + 1, c])
+            errors[:len(test), c] = Y[test, c] - model.predict(X[test])
+
+    return errors
+
+
+def rolling_origin_backtest(df, categories, origins, horizon=10, models=None, estimator_factory=mt.xgb_estimator,
+                            params=None, random_state=42, n_workers=None, min_train=28) -> dict:
+    """
+    Rolling-origin backtest of the category models.
+
+    With models, the trained models are re-scored: since the features do not depend on the origin,
+    every date is predicted once and the errors of all origins are gathered from those predictions.
+    Without models, a fresh pipeline with fixed params is refit on the data up to every origin, with the
+    origins spread over worker processes that share one memory-mapped copy of the feature matrix.
+
+    Parameters:
+        df (pandas.DataFrame): Features and target categories indexed by date
+        categories (list): Target category columns
+        origins (list): Forecast origin dates (the first forecasted day is the day after)
+        horizon (int): Number of days forecasted after each origin
+        models (dict, optional): Category -> trained model to re-score instead of refitting
+        estimator_factory (callable): Estimator factory used when refitting
+        params (dict, optional): Pipeline parameters used when refitting (e.g. the best_params of training)
+        random_state (int): Seed of the refit estimators
+        n_workers (int, optional): Number of worker processes, defaults to the number of cores
+        min_train (int): Minimum number of days up to an origin when refitting
+    Returns:
+        dict: 'errors' (origin x horizon x category float32 cube of actual - predicted, NaN past the data),
+              'origins' and 'categories'
+    """
+    df = df.sort_index()
+    dates = pd.DatetimeIndex(df.index)
+    X = df.drop(categories, axis=1)
+    Y = df[categories].to_numpy(dtype=float)
+    origins = pd.to_datetime(origins)
+    positions = _origin_positions(dates, origins, 1 if models is not None else min_train)
+
+    if models is not None:
+        # (dates x categories) predictions, gathered for every (origin, horizon) pair
+        predictions = np.column_stack([models[category].predict(X) for category in categories])
+        rows = positions[:, np.newaxis] + np.arange(1, horizon + 1)
+        valid = rows < len(dates)
+        rows = np.where(valid, rows, 0)
+        errors = (Y[rows] - predictions[rows]).astype(np.float32)
+        errors[~valid] = np.nan
+        return {'errors': errors, 'origins': origins, 'categories': list(categories)}
+
+    n_cores = cpu_count()
+    n_workers = min(n_workers or n_cores, len(origins))
+    n_threads = max(1, n_cores // n_workers)
+
+    # One read-only copy of the matrices shared by every worker
+    folder = tempfile.mkdtemp(prefix='backtest_')
+    try:
+        joblib.dump(X.to_numpy(dtype=float), os.path.join(folder, 'X.mmap'))
+        joblib.dump(Y, os.path.join(folder, 'Y.mmap'))
+        X_shared = joblib.load(os.path.join(folder, 'X.mmap'), mmap_mode='r')
+        Y_shared = joblib.load(os.path.join(folder, 'Y.mmap'), mmap_mode='r')
+
+        outputs = Parallel(n_jobs=n_workers, backend='loky')(
+            delayed(_refit_origin)(X_shared, Y_shared, pos, horizon, estimator_factory, params or {},
+                                   random_state, n_threads)
+            for pos in positions
+        )
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return {'errors': np.stack(outputs), 'origins': origins, 'categories': list(categories)}
+
+# Summaries
+# ------------------------------------------------------------------------------
+def horizon_errors(backtest) -> pd.DataFrame:
+    """
+    Summarizes the error cube by forecast horizon.
+    Parameters:
+        backtest (dict): Output of rolling_origin_backtest
+    Returns:
+        pandas.DataFrame: RMSE, MAE and bias of every (horizon, category) pair over the origins
+    """
+    errors = backtest['errors'].astype(float)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        stats = {
+            'rmse': np.sqrt(np.nanmean(errors ** 2, axis=0)),
+            'mae': np.nanmean(np.abs(errors), axis=0),
+            'bias': np.nanmean(errors, axis=0),
+            'n_origins': np.sum(~np.isnan(errors), axis=0)
+        }
+
+    index = pd.MultiIndex.from_product([np.arange(1, errors.shape[1] + 1), backtest['categories']],
+                                       names=['horizon', 'category'])
+    return pd.DataFrame({name: values.ravel() for name, values in stats.items()}, index=index)
@@ -8,6 +8,7 @@ import importlib
 import pandas as pd
 import os
 import glob
+import re
 import scripts.data_preprocessing as dp
 
 importlib.reload(dp)
@@ -95,38 +96,138 @@ def sales_csv_fetch(file_path: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def merge_all_sales(directory_path) -> pd.DataFrame:
+# POS export validation
+# ------------------------------------------------------------------------------
+# Bytes read from the start of an export to validate it (the item header ends within the first ~500 bytes,
+# the daily rows of a monthly sales report within the first ~3 KB)
+PREAMBLE_BYTES = 8192
+
+# Expected layout of every export kind
+EXPORT_SPECS = {
+    'items': {'report': 'Items Report', 'header': 'Category Name', 'columns': ['Category Name', 'Name', 'Net Sales', 'Sold']},
+    'sales': {'report': 'Sales Report', 'header': None, 'columns': ['Gross Sales', 'Net Sales']}
+}
+
+# Date range line, e.g. "Apr 2, 2024 12:00 AM - Apr 2, 2024 11:59 PM"
+DATE_LINE = re.compile(r'^"?([A-Z][a-z]{2} \d{1,2}, \d{4})(?: \d{1,2}:\d{2} [AP]M)? - ([A-Z][a-z]{2} \d{1,2}, \d{4})')
+
+def validate_export(file_path, kind) -> dict:
+    """
+    Checks the preamble of a POS export before it is parsed: report type, date line, header row and columns.
+    Only the first PREAMBLE_BYTES bytes of the file are read.
+    Parameters:
+        file_path (str): Path to the CSV file
+        kind (str): 'items' (item sales exports) or 'sales' (monthly sales exports)
+    Returns:
+        dict: 'file', 'valid', 'reason' (None, 'unreadable', 'empty', 'report_type', 'date_line',
+              'missing_header' or 'missing_columns'), 'detail' and the 'start' date of the report
+    """
+    spec = EXPORT_SPECS[kind]
+    result = {'file': file_path, 'valid': False, 'reason': None, 'detail': None, 'start': None}
+
+    try:
+        with open(file_path, 'rb') as file:
+            preamble = file.read(PREAMBLE_BYTES)
+    except OSError as e:
+        result.update(reason='unreadable', detail=str(e))
+        return result
+    if not preamble.strip():
+        result.update(reason='empty')
+        return result
+
+    lines = preamble.decode('utf-8-sig', errors='replace').splitlines()
+    if lines[0].strip() != spec['report']:
+        result.update(reason='report_type', detail=lines[0].strip()[:80])
+        return result
+
+    date_match = DATE_LINE.match(lines[1].strip()) if len(lines) > 1 else None
+    if date_match is None:
+        result.update(reason='date_line', detail=lines[1].strip()[:80] if len(lines) > 1 else None)
+        return result
+    result['start'] = pd.to_datetime(date_match.group(1), format='%b %d, %Y')
+
+    if kind == 'items':
+        # Header row with the required columns
+        header = next((line for line in lines if line.startswith(spec['header'])), None)
+        if header is None:
+            result.update(reason='missing_header')
+            return result
+        missing = [col for col in spec['columns'] if col not in header.split(',')]
+    else:
+        # Daily header row followed by the Gross Sales and Net Sales rows
+        header_idx = next((i for i, line in enumerate(lines) if any(day in line for day in ['Mon,', 'Tue,', 'Wed,'])), None)
+        if header_idx is None:
+            result.update(reason='missing_header')
+            return result
+        labels = {line.split(',')[0] for line in lines[header_idx + 1:]}
+        missing = [col for col in spec['columns'] if col not in labels]
+
+    if missing:
+        result.update(reason='missing_columns', detail=', '.join(missing))
+        return result
+
+    result['valid'] = True
+    return result
+
+def validate_exports(file_paths, kind) -> dict:
+    """
+    Validates many POS exports and summarizes the rejections.
+    Parameters:
+        file_paths (list): Paths to the CSV files
+        kind (str): 'items' or 'sales'
+    Returns:
+        dict: 'accepted' (list of valid paths), 'rejected' (DataFrame with the file, reason and detail of every
+              rejected export) and 'counts' (number of rejected files per reason)
+    """
+    results = [validate_export(file_path, kind) for file_path in file_paths]
+    rejected = pd.DataFrame([r for r in results if not r['valid']], columns=['file', 'reason', 'detail'])
+
+    return {
+        'accepted': [r['file'] for r in results if r['valid']],
+        'rejected': rejected,
+        'counts': rejected['reason'].value_counts().to_dict()
+    }
+
+def merge_all_sales(directory_path, return_report=False) -> pd.DataFrame:
     """
     Merges all CSV files in a directory into a single DataFrame.
+    Files are validated from their preamble first and malformed exports are skipped without being parsed.
     Parameters:
         directory_path (str): Path to the directory containing CSV files
+        return_report (bool): Also return the validation report (see validate_exports)
     Returns:
         pandas.DataFrame: Merged DataFrame
     """
         
     all_files = glob.glob(os.path.join(directory_path, "*.csv"))
     dfs = []
+
+    if directory_path.startswith('data/Item Sales'):
+        kind, fetch = 'items', item_sales_csv_fetch
+    elif directory_path == 'data/Sales':
+        kind, fetch = 'sales', sales_csv_fetch
+    else:
+        print(f"Unknown directory: {directory_path}")
+        return (None, None) if return_report else None
+
+    report = validate_exports(all_files, kind)
+    if report['counts']:
+        print(f"Skipped {len(report['rejected'])} of {len(all_files)} files in {directory_path}: {report['counts']}")
     
-    for file in all_files:
+    for file in report['accepted']:
         try:
-            if directory_path.startswith('data/Item Sales'):
-                df = item_sales_csv_fetch(file)
-            elif directory_path == 'data/Sales':
-                df = sales_csv_fetch(file)
-            else:
-                print(f"Unknown directory: {directory_path}")
-                return None
+            df = fetch(file)
             if df is not None:
                 dfs.append(df)
         except Exception as e:
             print(f"Error processing {file}: {e}")
             
     if not dfs:
-        return None
+        return (None, report) if return_report else None
         
     df = pd.concat(dfs)
     df.sort_index(inplace=True)
-    return df
+    return (df, report) if return_report else df
 
 # ------------------------------------------------------------------------------
 # API data fetching
@@ -214,11 +315,13 @@ def macroeconomic_fetch_fred(start_date = '2023-10-01', end_date = None) -> pd.D
 
 import requests
 from datetime import datetime
-def make_request(year) -> pd.DataFrame:
+def make_request(year, country='ca', location='ca-qc') -> pd.DataFrame:
     """
     Makes a request to the Calendarific API for Quebec holidays.
     Parameters:
         year (int): Year to fetch holidays for
+        country (str): Calendarific country code
+        location (str): Calendarific location code of the region
     Returns:
         pandas.DataFrame: DataFrame with holiday names and dates
     """
@@ -233,9 +336,9 @@ def make_request(year) -> pd.DataFrame:
 
     params = {
         'api_key': api_key,
-        'country': 'ca',
+        'country': country,
         'year': year,
-        'location': 'ca-qc'
+        'location': location
     }
     try:
         # Make the API request for 2023
@@ -1,4 +1,7 @@
 import pandas as pd
+import numpy as np
+import warnings
+from numpy.lib.stride_tricks import sliding_window_view
 
 #CSV files
 #------------------------------------------------------------------------------
@@ -98,6 +101,58 @@ def daily_resample(data, start_date='2023-10-01', end_date='2024-10-31'):
     data_daily = data_daily.reindex(pd.date_range(start=start_date, end=end_date, freq='D')).interpolate()
     return data_daily
 
+def daily_resample_batch(series, start_date='2023-10-01', end_date='2024-10-31', method='linear'):
+    """
+    Aligns any number of monthly or irregular series onto a shared daily grid in one vectorized pass.
+    With method='linear' every column matches daily_resample: values are interpolated in time between
+    observations, held at the last observation after it and NaN before the first one (daily_resample also
+    leaves NaN when the whole grid is after the last observation). With method='ffill'
+    each day takes the last observation on or before it, so no future value leaks into a day.
+    Parameters:
+        series (pd.DataFrame or list): A DataFrame of series (NaN where a series has no observation) or a list of
+                                       Series/DataFrames with their own observation dates
+        start_date (str): Start date.
+        end_date (str): End date.
+        method (str): 'linear' or 'ffill'.
+    Returns:
+        pd.DataFrame: Daily DataFrame with one column per series.
+    """
+    if method not in ('linear', 'ffill'):
+        raise ValueError(f"Unknown resampling method: {method}")
+    if isinstance(series, (list, tuple)):
+        series = pd.concat([s.to_frame() if isinstance(s, pd.Series) else s for s in series], axis=1)
+
+    # Shared timeline of the observation dates and the daily grid
+    grid = pd.date_range(start=start_date, end=end_date, freq='D')
+    timeline = pd.DatetimeIndex(series.index).union(grid)
+    values = series.reindex(timeline).to_numpy(dtype=float)
+    n_rows = len(timeline)
+    rows = np.arange(n_rows)[:, np.newaxis]
+
+    # Previous and next observation of every (day, series) cell
+    valid = ~np.isnan(values)
+    previous = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    following = np.minimum.accumulate(np.where(valid, rows, n_rows)[::-1], axis=0)[::-1]
+
+    columns = np.arange(values.shape[1])
+    has_previous = previous >= 0
+    previous_values = np.where(has_previous, values[np.maximum(previous, 0), columns], np.nan)
+
+    if method == 'linear':
+        has_following = following < n_rows
+        following = np.minimum(following, n_rows - 1)
+        times = timeline.asi8.astype(float)
+        span = times[following] - times[np.maximum(previous, 0)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(span > 0, (times[:, np.newaxis] - times[np.maximum(previous, 0)]) / span, 0.0)
+        interpolated = previous_values + weight * (values[following, columns] - previous_values)
+        daily = np.where(has_following, interpolated, previous_values)
+    else:
+        daily = previous_values
+
+    positions = timeline.get_indexer(grid)
+    return pd.DataFrame(daily[positions], index=grid, columns=series.columns)
+
 def remove_dollar_sign_and_convert(x):
     """
     Removes dollar sign and converts to float.
@@ -123,4 +178,110 @@ def remove_outliers(data, categories, threshold=3):
     for category in categories:
         z_scores = (data[category] - data[category].mean()) / data[category].std()
         data = data[abs(z_scores) < threshold]
-    return data
\ No newline at end of file
+    return data
+
+# Default threshold of each outlier method: z-score, robust z-score (median / scaled MAD) and IQR multiplier
+OUTLIER_THRESHOLDS = {'zscore': 3, 'mad': 3.5, 'iqr': 1.5}
+
+# Scale making the MAD a consistent estimator of the standard deviation of normal data
+MAD_SCALE = 1.4826
+
+# Maximum number of window cells (rows x columns x window) reduced at once in rolling mode
+OUTLIER_CHUNK_CELLS = 2 ** 20
+
+def _outlier_flags(values, reference, method, threshold):
+    """
+    Flags the values falling outside the bounds computed from the reference values of every column.
+    Parameters:
+        values (np.ndarray): (rows x columns) values to test.
+        reference (np.ndarray): Reference values, the statistics are taken over the last axis:
+                                (columns x rows) for the full data or (rows x columns x window) when rolling.
+        method (str): 'zscore', 'mad' or 'iqr'.
+        threshold (float): Threshold of the method.
+    Returns:
+        np.ndarray: (rows x columns) boolean outlier flags.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if method == 'zscore':
+            center = np.nanmean(reference, axis=-1)
+            scale = np.nanstd(reference, axis=-1, ddof=1)
+            return np.abs(values - center) / scale >= threshold
+        if method == 'mad':
+            center = np.nanmedian(reference, axis=-1)
+            scale = MAD_SCALE * np.nanmedian(np.abs(reference - np.expand_dims(center, -1)), axis=-1)
+            return np.abs(values - center) / scale >= threshold
+        if method == 'iqr':
+            q1, q3 = np.nanpercentile(reference, [25, 75], axis=-1)
+            spread = threshold * (q3 - q1)
+            return (values < q1 - spread) | (values > q3 + spread)
+    raise ValueError(f"Unknown outlier method: {method}")
+
+def outlier_mask(data, categories, method='zscore', threshold=None, window=None, min_periods=None):
+    """
+    Flags the rows to keep, testing every target column at once.
+    A row is dropped when any of its target values is an outlier; NaN values are never outliers.
+    In rolling mode each day is tested against the previous window days only, so the mask of a day
+    never depends on later data and can be computed as daily data comes in (see stream_outlier_mask).
+    Parameters:
+        data (pd.DataFrame): Input data.
+        categories (list): List of target variables.
+        method (str): 'zscore', 'mad' (median / scaled MAD robust z-score) or 'iqr' (Tukey fences).
+        threshold (float, optional): Threshold of the method, see OUTLIER_THRESHOLDS.
+        window (int, optional): Number of previous days in the rolling statistics, the full data if None.
+        min_periods (int, optional): Days are kept untested until the window holds this many values,
+                                     defaults to window.
+    Returns:
+        pd.Series: Boolean mask of the rows to keep.
+    """
+    if method not in OUTLIER_THRESHOLDS:
+        raise ValueError(f"Unknown outlier method: {method}")
+    threshold = OUTLIER_THRESHOLDS[method] if threshold is None else threshold
+    values = data[categories].to_numpy(dtype=float)
+
+    if window is None:
+        outliers = _outlier_flags(values, values.T, method, threshold)
+    else:
+        min_periods = window if min_periods is None else min_periods
+        # Previous window values of every (day, column) cell, a view on the NaN-padded values
+        padded = np.vstack([np.full((window, values.shape[1]), np.nan), values])
+        history = sliding_window_view(padded[:-1], window, axis=0)
+        # The reductions copy their input, so the windows are reduced in chunks of rows to bound the memory
+        chunk = max(1, OUTLIER_CHUNK_CELLS // (values.shape[1] * window))
+        outliers = np.zeros(values.shape, dtype=bool)
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=RuntimeWarning)
+            for start in range(0, len(values), chunk):
+                rows = slice(start, start + chunk)
+                outliers[rows] = _outlier_flags(values[rows], history[rows], method, threshold)
+                outliers[rows] &= (~np.isnan(history[rows])).sum(axis=-1) >= min_periods
+
+    outliers &= ~np.isnan(values)
+    return pd.Series(~outliers.any(axis=1), index=data.index)
+
+def filter_outliers(data, categories, method='zscore', threshold=None, window=None, min_periods=None):
+    """
+    Removes the outlier rows of every target column in one pass, see outlier_mask.
+    Unlike remove_outliers, the statistics of every category come from the same rows, so the result does not
+    depend on the category order.
+    Returns:
+        pd.DataFrame: Data without outliers.
+    """
+    return data[outlier_mask(data, categories, method, threshold, window, min_periods).to_numpy()]
+
+def stream_outlier_mask(history, new_data, categories, window, method='mad', threshold=None, min_periods=None):
+    """
+    Flags the incoming daily rows to keep, tested against the rolling statistics of the recent history.
+    Parameters:
+        history (pd.DataFrame): Previously ingested data, only the last window rows are used.
+        new_data (pd.DataFrame): Incoming rows, after the history.
+        categories (list): List of target variables.
+        window (int): Number of previous days in the rolling statistics.
+        method (str): 'zscore', 'mad' or 'iqr'.
+        threshold (float, optional): Threshold of the method.
+        min_periods (int, optional): See outlier_mask.
+    Returns:
+        pd.Series: Boolean mask of the new rows to keep.
+    """
+    recent = pd.concat([history[categories].iloc[-window:], new_data[categories]])
+    mask = outlier_mask(recent, categories, method, threshold, window, min_periods)
+    return mask.iloc[len(recent) - len(new_data):]
@@ -1,4 +1,7 @@
 import pandas as pd 
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
 
 
 # Local holidays
@@ -66,19 +69,90 @@ def create_time_features(start_date = '2023-10-01', end_date = '2024-10-31'):
     """
     Create time-based features DataFrame with numerical classification
     """
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    time_features = pd.DataFrame(index=date_range)
-    
-    # Extract time-based features
-    time_features['day_of_week'] = time_features.index.dayofweek
-    time_features['day_of_month'] = time_features.index.day
-    time_features['month'] = time_features.index.month
-    time_features['year'] = time_features.index.year
-    time_features['quarter'] = time_features.index.quarter
-    time_features['is_weekend'] = time_features['day_of_week'].isin([5, 6]).astype(int)
+    # Sliced from the precomputed calendar table
+    time_features = calendar_features(start_date, end_date,
+                                      ['day_of_week', 'day_of_month', 'month', 'year', 'quarter', 'is_weekend'])
+    time_features = time_features.astype({'day_of_week': 'int32', 'day_of_month': 'int32', 'month': 'int32',
+                                          'year': 'int32', 'quarter': 'int32', 'is_weekend': 'int64'})
     
     return time_features
 
+# Calendar table
+# ------------------------------------------------------------------------------
+# Range of the precomputed calendar, dates outside it are decomposed on the fly
+CALENDAR_START = pd.Timestamp('2000-01-01')
+CALENDAR_END = pd.Timestamp('2049-12-31')
+
+CALENDAR_COLUMNS = (['day_of_week', 'day_of_month', 'month', 'year', 'quarter', 'is_weekend']
+                    + [f'day_of_week_{d}' for d in range(7)] + [f'quarter_{q}' for q in range(1, 5)])
+CALENDAR_POSITION = {col: i for i, col in enumerate(CALENDAR_COLUMNS)}
+
+_calendar = None
+
+def _calendar_rows(dates):
+    """
+    Decomposes dates into the int16 calendar columns (CALENDAR_COLUMNS order).
+    """
+    dates = pd.DatetimeIndex(dates)
+    day_of_week = dates.dayofweek.to_numpy()
+    quarter = dates.quarter.to_numpy()
+
+    rows = np.empty((len(dates), len(CALENDAR_COLUMNS)), dtype=np.int16)
+    rows[:, 0] = day_of_week
+    rows[:, 1] = dates.day
+    rows[:, 2] = dates.month
+    rows[:, 3] = dates.year
+    rows[:, 4] = quarter
+    rows[:, 5] = day_of_week >= 5
+    rows[:, 6:13] = day_of_week[:, np.newaxis] == np.arange(7)
+    rows[:, 13:17] = quarter[:, np.newaxis] == np.arange(1, 5)
+
+    return rows
+
+def calendar_table():
+    """
+    The (days x CALENDAR_COLUMNS) int16 calendar from CALENDAR_START to CALENDAR_END, built once per process.
+    Row i is the day CALENDAR_START + i days.
+    """
+    global _calendar
+    if _calendar is None:
+        _calendar = _calendar_rows(pd.date_range(CALENDAR_START, CALENDAR_END, freq='D'))
+        _calendar.flags.writeable = False
+    return _calendar
+
+def calendar_slice(start_date, end_date, columns=None):
+    """
+    Takes the calendar rows of a date window by slicing the precomputed table at the day offsets.
+
+    Args:
+    start_date (str or datetime): First date of the window
+    end_date (str or datetime): Last date of the window
+    columns (list, optional): Calendar columns to keep, every column if None
+
+    Returns:
+    numpy.ndarray: The (days x columns) int16 calendar rows, a read-only view when columns is None
+    pandas.DatetimeIndex: The dates of the rows
+    """
+    start_date, end_date = pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+    dates = pd.date_range(start_date, end_date, freq='D')
+
+    if start_date >= CALENDAR_START and end_date <= CALENDAR_END:
+        offset = (start_date - CALENDAR_START).days
+        rows = calendar_table()[offset:offset + len(dates)]
+    else:
+        rows = _calendar_rows(dates)
+
+    if columns is not None:
+        rows = rows[:, [CALENDAR_POSITION[col] for col in columns]]
+    return rows, dates
+
+def calendar_features(start_date, end_date, columns=None):
+    """
+    Calendar features DataFrame of a date window, see calendar_slice
+    """
+    rows, dates = calendar_slice(start_date, end_date, columns)
+    return pd.DataFrame(rows.astype(np.int64), index=dates, columns=columns or CALENDAR_COLUMNS)
+
 def create_lag_features(df, cols, lags):
     """
     Creates lag features for specified columns and lag periods.
@@ -91,13 +165,130 @@ def create_lag_features(df, cols, lags):
     Returns:
     DataFrame: Updated DataFrame with lag features
     """
-    lag_features = []  # Store lag features here
-    for col in cols:
-        for lag in lags:
-            lag_col = df[col].shift(lag)  # Create the lagged feature
-            lag_col.name = f'{col}_lag_{lag}'  # Rename the column to match the naming convention
-            lag_features.append(lag_col)
-    # Concatenate the lag features with the original DataFrame
-    df = pd.concat([df] + lag_features, axis=1)
+    # Every lag of every column is written into one block, see window_features
+    lag_features = window_features(df, cols, lags=lags)
+    df = pd.concat([df, lag_features], axis=1)
     
-    return df
\ No newline at end of file
+    return df
+
+# Window features
+# ------------------------------------------------------------------------------
+def _rolling_sums(values, window):
+    """
+    Rolling sums of the values, squared values and non-NaN counts of every column from cumulative sums.
+    Columns are centered first so the squared sums do not lose precision.
+    """
+    valid = ~np.isnan(values)
+    centered = np.where(valid, values - np.nanmean(values, axis=0), 0.0)
+
+    def rolling(x):
+        cumsum = np.cumsum(np.vstack([np.zeros((1, x.shape[1])), x]), axis=0)
+        sums = np.full(x.shape, np.nan)
+        sums[window - 1:] = cumsum[window:] - cumsum[:-window]
+        return sums
+
+    return rolling(centered), rolling(centered ** 2), rolling(valid.astype(float)), np.nanmean(values, axis=0)
+
+
+def _ewm(values, span):
+    """
+    Exponentially weighted means of every column (pandas ewm(span, adjust=False)) with one linear filter.
+    Leading NaN values stay NaN, the filter starts at the first valid value of each column and
+    interior NaN values are forward-filled.
+    """
+    alpha = 2 / (span + 1)
+    valid = ~np.isnan(values)
+    first = np.where(valid.any(axis=0), valid.argmax(axis=0), len(values))
+    start_values = values[np.minimum(first, len(values) - 1), np.arange(values.shape[1])]
+    leading = np.arange(len(values))[:, np.newaxis] < first
+
+    # Row of the last valid value of every cell
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(values))[:, np.newaxis], 0), axis=0)
+    filled = np.where(leading, start_values, values[last_valid, np.arange(values.shape[1])])
+    ewm, _ = lfilter([alpha], [1, alpha - 1], filled, axis=0, zi=((1 - alpha) * start_values)[np.newaxis])
+    ewm[leading] = np.nan
+
+    return ewm
+
+
+def window_features(df, cols, lags=(), windows=(), stats=('mean', 'std'), spans=(), shift=0,
+                    dtype=np.float64):
+    """
+    Creates lag, rolling-window and exponentially weighted features of many columns at once.
+    Every feature type is computed for all the columns in one vectorized pass (cumulative sums for
+    rolling means and standard deviations, sliding windows for minimums and maximums, a linear filter
+    for the EWMs) and written into one preallocated block.
+
+    Rolling statistics follow pandas rolling(window) (current row included, NaN until the window is full)
+    and EWMs follow ewm(span, adjust=False) with gaps forward-filled. Use shift=1 for autoregressive features of the target so
+    the rolling and EWM features of a day only use the previous days, e.g.
+    window_features(sales, ['Coffee'], lags=[1, 7, 14], windows=[7, 28], spans=[7], shift=1).
+
+    Args:
+    df (DataFrame): Original DataFrame, one row per day
+    cols (list): Columns to create window features for
+    lags (list): Lag periods, named '<col>_lag_<lag>'; negative lags are leads, like shift(-n)
+    windows (list): Rolling window lengths, named '<col>_roll_<stat>_<window>'
+    stats (list): Rolling statistics among 'mean', 'std', 'min' and 'max'
+    spans (list): EWM spans, named '<col>_ewm_<span>'
+    shift (int): Periods the rolling and EWM features are shifted by
+    dtype (numpy.dtype): dtype of the feature block
+
+    Returns:
+    DataFrame: The window features, grouped by column, with the index of df
+    """
+    values = df[list(cols)].to_numpy(dtype=np.float64)
+    n_rows, n_cols = values.shape
+    kinds = ([('lag', lag) for lag in lags] + [(stat, window) for window in windows for stat in stats]
+             + [('ewm', span) for span in spans])
+
+    # (rows x columns * kinds) block, the features of a column are contiguous
+    block = np.full((n_rows, n_cols * len(kinds)), np.nan, dtype=dtype)
+
+    def write(k, features, periods=0):
+        # Features of kind k for every column, shifted down by periods (up for negative periods, i.e. leads)
+        if periods >= n_rows or -periods >= n_rows:
+            return
+        if periods >= 0:
+            block[periods:, k::len(kinds)] = features[:n_rows - periods]
+        else:
+            block[:n_rows + periods, k::len(kinds)] = features[-periods:]
+
+    sums = {}
+    for k, (kind, param) in enumerate(kinds):
+        if kind == 'lag':
+            write(k, values, param)
+        elif kind == 'ewm':
+            write(k, _ewm(values, param), shift)
+        elif param > n_rows:
+            continue
+        elif kind in ('mean', 'std'):
+            if param not in sums:
+                sums[param] = _rolling_sums(values, param)
+            total, squares, count, center = sums[param]
+            full = count == param
+            with np.errstate(invalid='ignore', divide='ignore'):
+                if kind == 'mean':
+                    write(k, np.where(full, total / param + center, np.nan), shift)
+                elif param > 1:
+                    variance = np.maximum((squares - total ** 2 / param) / (param - 1), 0)
+                    write(k, np.where(full, np.sqrt(variance), np.nan), shift)
+                # A one-day window has no sample standard deviation, the feature stays NaN like in pandas
+        else:
+            # (rows - window + 1 x columns x window) view of the windows, no copy
+            view = sliding_window_view(values, param, axis=0)
+            reduced = np.full(values.shape, np.nan)
+            reduced[param - 1:] = view.min(axis=-1) if kind == 'min' else view.max(axis=-1)
+            write(k, reduced, shift)
+
+    names = []
+    for col in cols:
+        for kind, param in kinds:
+            if kind == 'lag':
+                names.append(f'{col}_lag_{param}')
+            elif kind == 'ewm':
+                names.append(f'{col}_ewm_{param}')
+            else:
+                names.append(f'{col}_roll_{kind}_{param}')
+
+    return pd.DataFrame(block, index=df.index, columns=names)
\ No newline at end of file
@@ -1,16 +1,23 @@
+import numpy as np
 import pandas as pd
+import warnings
 from scripts.data_fetching import macroeconomic_fetch_fred, make_request
-from scripts.data_preprocessing import daily_resample
-from scripts.feature_engineering import create_pedestrianization, create_time_features, create_lag_features
+from scripts.data_preprocessing import daily_resample_batch
+from scripts.feature_engineering import create_pedestrianization, create_lag_features, calendar_features, calendar_slice
+from scripts import tracing
+from scripts.locations import LOCATIONS, DEFAULT_LOCATION, get_location
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import dill
 
 # Macroeconomic data
 # This function would be adjusted with the API for fetching the macroeconomic foreasts
-def macro_forecast(date) -> pd.DataFrame:
+def macro_forecast(date, method='linear') -> pd.DataFrame:
     """
     Fetches macroeconomic data for 30 days before and 10 days after the current date.
     Args:
         date (str): The current date
+        method (str): Daily resampling of the monthly series, 'linear' or 'ffill' (see daily_resample_batch)
     Returns:
         pandas.DataFrame: A DataFrame with macroeconomic data
     """
@@ -24,12 +31,9 @@ def macro_forecast(date) -> pd.DataFrame:
         print(f"An error occurred while fetching macroeconomic data: {e}")
 
 
-    cpi_daily = daily_resample(cpi, start_date=start_date, end_date=end_date)
-    unemployment_daily = daily_resample(unemployment, start_date=start_date, end_date=end_date)
-    bond_yields_daily = daily_resample(bond_yields, start_date=start_date, end_date=end_date)
-
-    # Concatenate the data
-    macroeconomic = pd.concat([cpi_daily, unemployment_daily, bond_yields_daily], axis=1)
+    # Align every series on the daily grid at once
+    macroeconomic = daily_resample_batch([cpi, unemployment, bond_yields], start_date=start_date, end_date=end_date,
+                                         method=method)
 
     # Create lag features
     macroeconomic_lags = create_lag_features(macroeconomic, cols=['CPI', 'Unemployment Rate', 'Bond Yields'], lags=[7, 10])
@@ -46,19 +50,21 @@ import meteostat
 from datetime import datetime, timedelta
 import os
 
-def weather_forecast(date):
+def weather_forecast(date, location=None):
     """
     Fetches the daily forecast for 10 days from the current date.
     Args:
         date (str): The current date
+        location (str or dict, optional): The store location, see scripts/locations.py
     Returns:
         pandas.DataFrame: A forecast of weather data
     """
+    location = get_location(location)
     try:
         # Set the location
-        location = meteostat.Point(lat=45.47, lon=-73.74, alt = 32)
+        point = meteostat.Point(lat=location['lat'], lon=location['lon'], alt=location['alt'])
         # Get the forecast data
-        forecast = meteostat.Daily(location, start=datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1), end=datetime.strptime(date, '%Y-%m-%d') + timedelta(days=10))
+        forecast = meteostat.Daily(point, start=datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1), end=datetime.strptime(date, '%Y-%m-%d') + timedelta(days=10))
         forecast = forecast.fetch()
     except Exception as e:
         print(f"An error occurred while fetching weather forecast data: {e}")
@@ -69,22 +75,37 @@ def weather_forecast(date):
 
 # Holiday Feature
 
-def holidays(date):
+def holiday_cache_file(year, location):
+    """
+    Path of the cached holidays of a year and a location.
+    Args:
+        year (int): The year
+        location (dict): The store location
+    Returns:
+        str: The CSV cache path, the Quebec calendar keeps the original 'holidays_<year>.csv' files
+    """
+    if (location['country'], location['region']) == ('ca', 'ca-qc'):
+        return os.path.join('data', f'holidays_{year}.csv')
+    return os.path.join('data', f"holidays_{location['region']}_{year}.csv")
+
+def holidays(date, location=None):
     """
     Fetches the holiday data for 10 days from the current date.
     Args:
         date (str): The current date
+        location (str or dict, optional): The store location, see scripts/locations.py
     Returns:
         pandas.DataFrame: A forecast of holiday data
     """
 
+    location = get_location(location)
     start_date = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)
     end_date = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=10)
     start_year = start_date.year
     end_year = end_date.year
     try:
-        start_cached_file = os.path.join('data',    f'holidays_{start_year}.csv')
-        end_cached_file = os.path.join('data', f'holidays_{end_year}.csv')
+        start_cached_file = holiday_cache_file(start_year, location)
+        end_cached_file = holiday_cache_file(end_year, location)
         if start_year != end_year:
             # Check if the holiday data for the start and end year are already cached
             if os.path.exists(start_cached_file) and os.path.exists(end_cached_file):
@@ -92,22 +113,26 @@ def holidays(date):
                 start_year_holidays = pd.read_csv(start_cached_file, index_col=0)
                 end_year_holidays = pd.read_csv(end_cached_file, index_col=0)
                 print(f"Using cached holiday data from {start_cached_file} and {end_cached_file}")
+                tracing.annotate(cache='hit')
             else:
                 # Fetch the holiday data for both years and save them to CSV files
-                start_year_holidays = make_request(start_year)
+                start_year_holidays = make_request(start_year, location['country'], location['region'])
                 start_year_holidays.to_csv(start_cached_file)
-                end_year_holidays = make_request(end_year)
+                end_year_holidays = make_request(end_year, location['country'], location['region'])
                 end_year_holidays.to_csv(end_cached_file)
+                tracing.annotate(cache='miss')
             df = pd.concat([start_year_holidays, end_year_holidays], axis=0)
         else:
             if os.path.exists(start_cached_file):
                 # Load the cached data
                 df = pd.read_csv(start_cached_file)
                 print(f"Using cached holiday data from {start_cached_file}")
+                tracing.annotate(cache='hit')
             else:
                 # Fetch the holiday data and save it to a CSV file
-                df = make_request(start_year)
+                df = make_request(start_year, location['country'], location['region'])
                 df.to_csv(start_cached_file)
+                tracing.annotate(cache='miss')
     except Exception as e:
         print(f"An error occurred while fetching holiday data: {e}")
     
@@ -161,16 +186,17 @@ def major_holiday_feature(df, date):
 
     return df.drop('Name', axis=1)
 
-def holiday_feature(date):
+def holiday_feature(date, location=None):
     """
     Creates a holiday feature for the given date.
     Args:
         date (str): The current date
+        location (str or dict, optional): The store location, see scripts/locations.py
     Returns:
         pandas.DataFrame: A DataFrame with holiday features
     """
 
-    holiday_data = holidays(date)
+    holiday_data = holidays(date, location)
     holiday_feature = major_holiday_feature(holiday_data, date)
     holiday_feature = holiday_feature.groupby(holiday_feature.index).max()
     holiday_feature = holiday_feature.sort_index()
@@ -185,25 +211,38 @@ def holiday_feature(date):
 
 # Pedestrianization
 
-def pedestrianization(date, ped_start, ped_end):
+def pedestrianization(date, ped_start, ped_end, location=None):
     """
     Creates a pedestrianization feature for the given date.
     Args:
         date (str): The current date
         ped_start (str): Start date for pedestrianization in 'YYYY-MM-DD' format.
         ped_end (str): End date for pedestrianization in 'YYYY-MM-DD' format.
+        location (str or dict, optional): The store location whose pedestrianization windows are used
+            when ped_start and ped_end are None, see scripts/locations.py
     Returns:
         pandas.DataFrame: A DataFrame with pedestrianization feature
     """
 
     start_date = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)
     end_date = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=10)
-    pedestrian_feature = create_pedestrianization('2025-06-01', '2025-09-30', start_date, end_date)
+    if ped_start is not None and ped_end is not None:
+        windows = [(ped_start, ped_end)]
+    else:
+        windows = get_location(location)['pedestrianization']
+
+    pedestrian_feature = pd.DataFrame({'is_pedestrian': 0}, index=pd.date_range(start_date, end_date, freq='D'))
+    for window_start, window_end in windows:
+        window = create_pedestrianization(window_start, window_end, start_date, end_date)
+        pedestrian_feature['is_pedestrian'] |= window['is_pedestrian']
 
     return pedestrian_feature
 
 # Time features
 
+# Calendar features used by the sales models
+TIME_FEATURES = ['is_weekend', 'day_of_week_4', 'quarter_3']
+
 def time_features(date):
     """
     Creates time features for the given date.
@@ -216,33 +255,100 @@ def time_features(date):
     start_date = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)
     end_date = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=10)
 
-    time_features = create_time_features(start_date, end_date)
-    time_features = time_features.drop(columns = ['year', 'month', 'day_of_month'])
-
-    time_features = pd.get_dummies(time_features, columns=['day_of_week']).astype(int)
-    time_features['quarter_1'] = time_features['quarter'].apply(lambda x: 1 if x == 1 else 0)
-    time_features['quarter_3'] = time_features['quarter'].apply(lambda x: 1 if x == 3 else 0)
-    time_features = time_features[['is_weekend', 'day_of_week_4', 'quarter_3']]
+    # Dummy encodings sliced from the precomputed calendar table
+    time_features = calendar_features(start_date, end_date, TIME_FEATURES)
 
     return time_features
 
 
 # Forecast Pipeline
 
-def load_sales_model_and_forecast(model_path, df, date):
+# Feature order expected by the sales models
+FEATURE_ORDER = ['closed', 'holiday_type_2',
+   'is_pedestrian', 'is_weekend', 'CPI', 'tavg', 'wspd', 'quarter_3',
+   'day_of_week_4', 'CPI_lag_7', 'Bond Yields_lag_10', 'before_holiday',
+   'tavg_weekend'
+]
+
+# Interaction features: column -> the source columns it is the product of
+INTERACTIONS = {'tavg_weekend': ('tavg', 'is_weekend')}
+
+# Trained model for each sales category of the default store
+SALES_MODELS = LOCATIONS[DEFAULT_LOCATION]['models']
+
+def load_sales_model(model_path):
     """
-    Loads a pickled dilled model and produces forecasts.
+    Loads a pickled dilled model.
 
     Args:
         model_path (str): Path to the pickled dilled model.
+
+    Returns:
+        sklearn.pipeline.Pipeline: The trained model.
+    """
+    with tracing.span('model_load', model=os.path.basename(model_path)):
+        with open(model_path, 'rb') as f:
+            model = dill.load(f)
+
+    check_feature_schema(model)
+
+    return model
+
+def check_feature_schema(model, feature_order=FEATURE_ORDER):
+    """
+    Checks once that a model was trained on the pipeline features in the pipeline order,
+    so feature matrices can be passed to it as plain arrays.
+
+    Args:
+        model (sklearn.pipeline.Pipeline): The trained model.
+        feature_order (list): The expected feature order.
+
+    Raises:
+        ValueError: If the model features differ from the expected ones.
+    """
+    model_features = getattr(model, 'feature_names_in_', None)
+    if model_features is not None and list(model_features) != list(feature_order):
+        raise ValueError(f"The model features {list(model_features)} do not match the pipeline features {list(feature_order)}")
+
+def predict_matrix(model, X):
+    """
+    Predicts from a feature array in FEATURE_ORDER without converting it to a DataFrame.
+    The array keeps its dtype (float32) through the scaler and the regressor.
+
+    Args:
+        model (sklearn.pipeline.Pipeline): The trained model, checked with check_feature_schema.
+        X (numpy.ndarray): The (rows x features) feature array.
+
+    Returns:
+        numpy.ndarray: The predicted values.
+    """
+    with tracing.span('predict') as record:
+        with warnings.catch_warnings():
+            # The schema was checked at load time, the array has no feature names by design
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            Xt = X
+            for _, step in model.steps[:-1]:
+                Xt = step.transform(Xt)
+            predictions = model.steps[-1][1].predict(Xt)
+        record['rows'] = len(predictions)
+
+    return predictions
+
+def forecast_sales(model, df, date):
+    """
+    Produces forecasts with an already loaded model.
+
+    Args:
+        model (sklearn.pipeline.Pipeline): The trained model.
         df (pandas.DataFrame): The DataFrame containing the features for forecasting.
+        date (str or datetime): The current date.
 
     Returns:
-        numpy.ndarray: The forecasted values.
+        pandas.DataFrame: The forecasted values indexed by date.
     """
-    with open(model_path, 'rb') as f:
-        model = dill.load(f)
-    predictions = model.predict(df)
+    with tracing.span('predict') as record:
+        predictions = model.predict(df)
+        record['rows'] = len(predictions)
 
     # Check if the date is in the correct format
     if isinstance(date, str):
@@ -254,6 +360,41 @@ def load_sales_model_and_forecast(model_path, df, date):
 
     return predictions
 
+def load_sales_model_and_forecast(model_path, df, date):
+    """
+    Loads a pickled dilled model and produces forecasts.
+
+    Args:
+        model_path (str): Path to the pickled dilled model.
+        df (pandas.DataFrame): The DataFrame containing the features for forecasting.
+
+    Returns:
+        numpy.ndarray: The forecasted values.
+    """
+    model = load_sales_model(model_path)
+
+    return forecast_sales(model, df, date)
+
+def forecast_categories(model, X, dates, categories):
+    """
+    Produces the forecasts of every category with one multi-output model
+    (see model_training.xgb_train_multi_log).
+
+    Args:
+        model (sklearn.pipeline.Pipeline): The trained multi-output model.
+        X (numpy.ndarray): The (days x features) feature array from forecast_matrix.
+        dates (pandas.DatetimeIndex): The forecasted dates.
+        categories (list): The categories in the order the model was trained on.
+
+    Returns:
+        pandas.DataFrame: The (days x categories) forecasted values indexed by date.
+    """
+    predictions = predict_matrix(model, X).reshape(len(X), -1)
+    if predictions.shape[1] != len(categories):
+        raise ValueError(f"The model predicts {predictions.shape[1]} categories, {len(categories)} were given")
+
+    return pd.DataFrame(predictions, index=dates.date, columns=categories)
+
 def reorder_columns(df):
     """
     Reorders the columns of the input DataFrame to the desired order.
@@ -267,11 +408,7 @@ def reorder_columns(df):
     Raises:
         ValueError: If any required column is missing in the DataFrame.
     """
-    desired_order = ['closed', 'holiday_type_2',
-       'is_pedestrian', 'is_weekend', 'CPI', 'tavg', 'wspd', 'quarter_3',
-       'day_of_week_4', 'CPI_lag_7', 'Bond Yields_lag_10', 'before_holiday',
-       'tavg_weekend'
-    ]
+    desired_order = FEATURE_ORDER
     
     # Check if all required columns are present
     missing = [col for col in desired_order if col not in df.columns]
@@ -283,41 +420,267 @@ def reorder_columns(df):
 
 ## 
 
-def forecast_pipe(date, ped_start, ped_end, closed_dates = None):
+def fetch_features(date, ped_start, ped_end, location=None):
     """
-    Main function to fetch data and create features for forecasting.
+    Fetches the external data and creates the raw feature frames for forecasting.
 
     Args:
     date (str): The current date in 'YYYY-MM-DD' format.
     ped_start (str): Start date for pedestrianization in 'YYYY-MM-DD' format.
     ped_end (str): End date for pedestrianization in 'YYYY-MM-DD' format.
-    closed_dates (list, optional): List of dates when the store is closed.
+    location (str or dict, optional): The store location, see scripts/locations.py
 
     Returns:
-    pandas.DataFrame: A DataFrame with the features for forecasting.
+    dict: The macroeconomic, weather, holiday and pedestrianization feature DataFrames.
     """
-   
+
     # Macroeconomic indicators fetch
-    macroeconomic = macro_forecast(date)
+    with tracing.span('fred_macro') as record:
+        macroeconomic = macro_forecast(date)
+        record['rows'] = len(macroeconomic)
 
     # Weather forecast fetch
-    weather = weather_forecast(date)
+    with tracing.span('meteostat_weather') as record:
+        weather = weather_forecast(date, location)
+        record['rows'] = len(weather)
 
     # Holiday feature
-    holidays = holiday_feature(date)
+    with tracing.span('calendarific_holidays') as record:
+        holidays = holiday_feature(date, location)
+        record['rows'] = len(holidays)
 
     # Pedestrianization feature
-    pedestrian = pedestrianization(date, ped_start, ped_end)
+    with tracing.span('pedestrianization') as record:
+        pedestrian = pedestrianization(date, ped_start, ped_end, location)
+        record['rows'] = len(pedestrian)
+
+    return {'macroeconomic': macroeconomic, 'weather': weather, 'holidays': holidays, 'pedestrian': pedestrian}
+
+def forecast_pipe(date, ped_start, ped_end, closed_dates = None, location = None):
+    """
+    Main function to fetch data and create features for forecasting.
+
+    Args:
+    date (str): The current date in 'YYYY-MM-DD' format.
+    ped_start (str): Start date for pedestrianization in 'YYYY-MM-DD' format.
+    ped_end (str): End date for pedestrianization in 'YYYY-MM-DD' format.
+    closed_dates (list, optional): List of dates when the store is closed.
+    location (str or dict, optional): The store location, see scripts/locations.py
+
+    Returns:
+    pandas.DataFrame: A DataFrame with the features for forecasting.
+    """
+    features = fetch_features(date, ped_start, ped_end, location)
 
     # Time features
-    time_fs = time_features(date)
+    with tracing.span('time_features') as record:
+        time_fs = time_features(date)
+        record['rows'] = len(time_fs)
+
+    return assemble_features(features, time_fs, closed_dates)
+
+def assemble_features(features, time_fs, closed_dates = None):
+    """
+    Merges the fetched feature frames and the time features into the model features.
+
+    Args:
+    features (dict): The feature DataFrames from fetch_features.
+    time_fs (pandas.DataFrame): The time features from time_features.
+    closed_dates (list, optional): List of dates when the store is closed.
 
+    Returns:
+    pandas.DataFrame: A DataFrame with the features for forecasting.
+    """
     # Merge the features & extra feature engineering
-    data = pd.concat([macroeconomic, weather, holidays, pedestrian, time_fs], axis=1)
-    data['tavg_weekend'] = data['tavg'] * data['is_weekend']
-    data['closed'] = 0
-    if closed_dates is not None:
-            data.loc[closed_dates, 'closed'] = 1
-    data = reorder_columns(data)
-
-    return data
\ No newline at end of file
+    with tracing.span('feature_assembly') as record:
+        data = pd.concat(list(features.values()) + [time_fs], axis=1)
+        for col, (left, right) in INTERACTIONS.items():
+            data[col] = data[left] * data[right]
+        data['closed'] = 0
+        if closed_dates is not None:
+                data.loc[closed_dates, 'closed'] = 1
+        data = reorder_columns(data)
+        record['rows'] = len(data)
+
+    return data
+
+def forecast_matrix(date, ped_start, ped_end, closed_dates = None, location = None):
+    """
+    Fetches data and writes the features for forecasting straight into a preallocated
+    float32 array in FEATURE_ORDER, skipping the intermediate DataFrames of forecast_pipe.
+
+    Args:
+    date (str): The current date in 'YYYY-MM-DD' format.
+    ped_start (str): Start date for pedestrianization in 'YYYY-MM-DD' format.
+    ped_end (str): End date for pedestrianization in 'YYYY-MM-DD' format.
+    closed_dates (list, optional): List of dates when the store is closed.
+    location (str or dict, optional): The store location, see scripts/locations.py
+
+    Returns:
+    numpy.ndarray: The (10 days x features) float32 feature array.
+    pandas.DatetimeIndex: The forecasted dates.
+    """
+    features = fetch_features(date, ped_start, ped_end, location)
+
+    return assemble_matrix(date, features, closed_dates)
+
+def assemble_matrix(date, features, closed_dates = None):
+    """
+    Writes the fetched feature frames and the time features into a preallocated float32 array in FEATURE_ORDER.
+
+    Args:
+    date (str): The current date in 'YYYY-MM-DD' format.
+    features (dict): The feature DataFrames from fetch_features.
+    closed_dates (list, optional): List of dates when the store is closed.
+
+    Returns:
+    numpy.ndarray: The (10 days x features) float32 feature array.
+    pandas.DatetimeIndex: The forecasted dates.
+
+    Raises:
+    KeyError: If a feature of FEATURE_ORDER is missing from every source (e.g. a failed FRED series).
+    """
+    sources = ['macroeconomic', 'weather', 'holidays', 'pedestrian']
+    built = set(TIME_FEATURES) | set(INTERACTIONS) | {'closed'}
+    fetched = set().union(*(features[name].columns for name in sources))
+    missing = [col for col in FEATURE_ORDER if col not in built and col not in fetched]
+    if missing:
+        raise KeyError(f"The following required columns are missing from the fetched features: {missing}")
+
+    with tracing.span('feature_assembly') as record:
+        start_date = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)
+        dates = pd.date_range(start_date, start_date + timedelta(days=9))
+        position = {col: i for i, col in enumerate(FEATURE_ORDER)}
+        X = np.zeros((len(dates), len(FEATURE_ORDER)), dtype=np.float32)
+
+        # Copy every fetched column into its slot, leaving NaN for dates missing from a source
+        for name in sources:
+            frame = features[name]
+            rows = pd.DatetimeIndex(frame.index).get_indexer(dates)
+            found = rows >= 0
+            for col in frame.columns.intersection(FEATURE_ORDER):
+                X[:, position[col]] = np.nan
+                X[found, position[col]] = frame[col].to_numpy()[rows[found]]
+
+        # Time features sliced from the calendar table, and interactions
+        calendar, _ = calendar_slice(dates[0], dates[-1], TIME_FEATURES)
+        X[:, [position[col] for col in TIME_FEATURES]] = calendar
+        for col, (left, right) in INTERACTIONS.items():
+            X[:, position[col]] = X[:, position[left]] * X[:, position[right]]
+        if closed_dates is not None:
+            X[dates.isin(pd.to_datetime(closed_dates)), position['closed']] = 1
+        record['rows'] = len(X)
+
+    return X, dates
+
+# Multi-store forecasts
+
+def fetch_store_features(date, stores=None, max_workers=None):
+    """
+    Fetches the raw feature frames of many stores in one batch. The macroeconomic data is fetched once,
+    the holidays once per calendar region and the weather of every store concurrently.
+
+    Args:
+    date (str): The current date in 'YYYY-MM-DD' format.
+    stores (list, optional): Store names from scripts/locations.py, every registered store if None.
+    max_workers (int, optional): Number of concurrent weather fetches, one per store by default.
+
+    Returns:
+    dict: Store name -> feature DataFrames as returned by fetch_features.
+    """
+    locations = {name: get_location(name) for name in (stores or list(LOCATIONS))}
+
+    # Shared by every store
+    with tracing.span('fred_macro') as record:
+        macroeconomic = macro_forecast(date)
+        record['rows'] = len(macroeconomic)
+
+    calendars = {}
+    for location in locations.values():
+        region = (location['country'], location['region'])
+        if region not in calendars:
+            with tracing.span('calendarific_holidays', region=location['region']) as record:
+                calendars[region] = holiday_feature(date, location)
+                record['rows'] = len(calendars[region])
+
+    def fetch_weather(name):
+        with tracing.span('meteostat_weather', location=name) as record:
+            weather = weather_forecast(date, locations[name])
+            record['rows'] = len(weather)
+        return weather
+
+    # Each fetch runs in a copy of the current context so its span joins the running trace
+    with ThreadPoolExecutor(max_workers=max_workers or len(locations)) as executor:
+        futures = {name: executor.submit(contextvars.copy_context().run, fetch_weather, name) for name in locations}
+        weather = {name: future.result() for name, future in futures.items()}
+
+    store_features = {}
+    for name, location in locations.items():
+        with tracing.span('pedestrianization', location=name) as record:
+            pedestrian = pedestrianization(date, None, None, location)
+            record['rows'] = len(pedestrian)
+        store_features[name] = {'macroeconomic': macroeconomic, 'weather': weather[name],
+                                'holidays': calendars[(location['country'], location['region'])],
+                                'pedestrian': pedestrian}
+
+    return store_features
+
+def _store_closed_dates(closed_dates, name):
+    """Closed dates of one store from a list shared by every store or a dict of store -> list"""
+    if isinstance(closed_dates, dict):
+        return closed_dates.get(name)
+    return closed_dates
+
+def forecast_pipe_stores(date, stores=None, closed_dates=None, max_workers=None):
+    """
+    Runs forecast_pipe for many stores in one batch, see fetch_store_features.
+
+    Args:
+    date (str): The current date in 'YYYY-MM-DD' format.
+    stores (list, optional): Store names, every registered store if None.
+    closed_dates (list or dict, optional): Closed dates of every store, or store name -> closed dates.
+    max_workers (int, optional): Number of concurrent weather fetches.
+
+    Returns:
+    dict: Store name -> DataFrame with the features for forecasting.
+    """
+    store_features = fetch_store_features(date, stores, max_workers)
+
+    # Time features are the same for every store
+    with tracing.span('time_features') as record:
+        time_fs = time_features(date)
+        record['rows'] = len(time_fs)
+
+    return {name: assemble_features(features, time_fs, _store_closed_dates(closed_dates, name))
+            for name, features in store_features.items()}
+
+def forecast_stores(date, stores=None, closed_dates=None, models=None, max_workers=None):
+    """
+    Forecasts the sales of every category of many stores in one batch.
+
+    Args:
+    date (str): The current date in 'YYYY-MM-DD' format.
+    stores (list, optional): Store names, every registered store if None.
+    closed_dates (list or dict, optional): Closed dates of every store, or store name -> closed dates.
+    models (dict, optional): Model path -> already loaded model, filled with the models loaded here.
+    max_workers (int, optional): Number of concurrent weather fetches.
+
+    Returns:
+    dict: Store name -> (days x categories) DataFrame of forecasted sales indexed by date.
+    """
+    models = {} if models is None else models
+    store_features = fetch_store_features(date, stores, max_workers)
+
+    forecasts = {}
+    for name, features in store_features.items():
+        X, dates = assemble_matrix(date, features, _store_closed_dates(closed_dates, name))
+
+        # Stores sharing a model set load it once
+        predictions = {}
+        for category, path in get_location(name)['models'].items():
+            if path not in models:
+                models[path] = load_sales_model(path)
+            predictions[category] = predict_matrix(models[path], X)
+        forecasts[name] = pd.DataFrame(predictions, index=dates.date)
+
+    return forecasts
@@ -0,0 +1,178 @@
+# Description: This file contains the out-of-core item sales history. Item exports are ingested into a parquet Arrow
+# dataset partitioned by store and month, and history queries push their predicates (store, date range, category) and
+# column selection down to the scan, so only the needed partitions and columns are read, batch by batch.
+
+import glob
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from scripts.data_fetching import item_sales_csv_fetch, validate_exports
+from scripts.item_forecasting import CATEGORY_MAP
+
+HISTORY_PATH = os.path.join('data', 'history')
+
+# Columns of the item rows (as returned by item_sales_csv_fetch) and the partition keys
+HISTORY_SCHEMA = pa.schema([
+    ('date', pa.timestamp('ns')),
+    ('Category Name', pa.string()),
+    ('Name', pa.string()),
+    ('Net Sales', pa.float64()),
+    ('Sold', pa.int64()),
+    ('store', pa.string()),
+    ('month', pa.string())
+])
+PARTITIONING = ds.partitioning(pa.schema([('store', pa.string()), ('month', pa.string())]), flavor='hive')
+
+# Ingestion
+# ------------------------------------------------------------------------------
+def ingest_items(items, store, root=HISTORY_PATH):
+    """
+    Merges item rows into the history. The days present in the rows replace the stored days of the store,
+    the other days of their months are kept, so daily or partial-month exports can be appended and
+    re-ingesting an export is idempotent. Only the (store, month) partitions of the rows are read and rewritten.
+    Parameters:
+        items (pandas.DataFrame): Item rows with 'date', 'Category Name', 'Name', 'Net Sales' and 'Sold'
+        store (str): Store of the rows, see scripts/locations.py
+        root (str): The history directory
+    Returns:
+        int: Number of rows written
+    """
+    dates = pd.to_datetime(items['date']).astype('datetime64[ns]')
+    rows = items[['date', 'Category Name', 'Name', 'Net Sales', 'Sold']].assign(
+        date=dates,
+        store=store,
+        month=dates.dt.strftime('%Y-%m')
+    )
+    table = pa.Table.from_pandas(rows, schema=HISTORY_SCHEMA, preserve_index=False)
+
+    # Stored rows of the touched partitions on the days the new rows do not cover
+    if os.path.isdir(root):
+        days = pa.array(dates.dt.normalize().unique(), type=pa.timestamp('ns'))
+        kept = history_dataset(root).to_table(filter=(
+            (ds.field('store') == store) & ds.field('month').isin(rows['month'].unique().tolist())
+            & ~ds.field('date').isin(days)
+        ))
+        table = pa.concat_tables([kept.select(HISTORY_SCHEMA.names), table])
+
+    ds.write_dataset(table, root, format='parquet', partitioning=PARTITIONING,
+                     existing_data_behavior='delete_matching', basename_template='part-{i}.parquet')
+    return len(rows)
+
+
+def ingest_directory(directory_path, store, root=HISTORY_PATH):
+    """
+    Validates, parses and ingests the item exports of one directory (e.g. 'data/Item Sales/April 2024'),
+    see ingest_items.
+    Parameters:
+        directory_path (str): Directory of item export CSV files
+        store (str): Store of the exports
+        root (str): The history directory
+    Returns:
+        dict: The validation report of the directory (see validate_exports) with the number of 'rows' written
+    """
+    report = validate_exports(glob.glob(os.path.join(directory_path, '*.csv')), 'items')
+    frames = [df for df in (item_sales_csv_fetch(file) for file in report['accepted']) if df is not None]
+
+    report['rows'] = ingest_items(pd.concat(frames), store, root) if frames else 0
+    return report
+
+# Scans
+# ------------------------------------------------------------------------------
+def history_dataset(root=HISTORY_PATH):
+    """
+    Opens the history dataset without reading it.
+    Parameters:
+        root (str): The history directory
+    Returns:
+        pyarrow.dataset.Dataset: The partitioned dataset
+    """
+    return ds.dataset(root, format='parquet', partitioning=PARTITIONING, schema=HISTORY_SCHEMA)
+
+
+def history_filter(stores=None, start=None, end=None, categories=None):
+    """
+    Builds the scan predicate. Store and month conditions prune whole partitions, the others
+    are pushed down to the parquet row groups.
+    Parameters:
+        stores (list, optional): Stores to keep
+        start (str, optional): First date in 'YYYY-MM-DD' format
+        end (str, optional): Last date in 'YYYY-MM-DD' format
+        categories (list, optional): POS categories ('Category Name') to keep
+    Returns:
+        pyarrow.dataset.Expression: The predicate, None if there is no condition
+    """
+    conditions = []
+    if stores is not None:
+        conditions.append(ds.field('store').isin(list(stores)))
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append(ds.field('month') >= start.strftime('%Y-%m'))
+        conditions.append(ds.field('date') >= pa.scalar(start, type=pa.timestamp('ns')))
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions.append(ds.field('month') <= end.strftime('%Y-%m'))
+        conditions.append(ds.field('date') <= pa.scalar(end, type=pa.timestamp('ns')))
+    if categories is not None:
+        conditions.append(ds.field('Category Name').isin(list(categories)))
+
+    predicate = None
+    for condition in conditions:
+        predicate = condition if predicate is None else predicate & condition
+    return predicate
+
+
+def iter_history(columns=None, stores=None, start=None, end=None, categories=None, batch_size=131072,
+                 root=HISTORY_PATH):
+    """
+    Scans the history batch by batch, reading only the matching partitions and the requested columns.
+    Parameters:
+        columns (list, optional): Columns to read, every column if None
+        stores, start, end, categories: Scan predicate, see history_filter
+        batch_size (int): Maximum number of rows per batch
+        root (str): The history directory
+    Yields:
+        pandas.DataFrame: The rows of one batch
+    """
+    scanner = history_dataset(root).scanner(columns=columns, filter=history_filter(stores, start, end, categories),
+                                            batch_size=batch_size)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_history(columns=None, stores=None, start=None, end=None, categories=None, root=HISTORY_PATH) -> pd.DataFrame:
+    """
+    Reads the matching history rows into one DataFrame, see iter_history.
+    Returns:
+        pandas.DataFrame: The rows in the merge_all_sales layout (plus the requested partition columns)
+    """
+    table = history_dataset(root).to_table(columns=columns, filter=history_filter(stores, start, end, categories))
+    return table.to_pandas()
+
+# Aggregates
+# ------------------------------------------------------------------------------
+def daily_category_sales(stores=None, start=None, end=None, category_map=CATEGORY_MAP, root=HISTORY_PATH):
+    """
+    Daily net sales of every model category (the training targets), aggregated while scanning so memory
+    only holds one batch and the running daily totals.
+    Parameters:
+        stores (list, optional): Stores summed together, every store if None
+        start (str, optional): First date in 'YYYY-MM-DD' format
+        end (str, optional): Last date in 'YYYY-MM-DD' format
+        category_map (dict): POS category -> model category, see item_forecasting.CATEGORY_MAP
+        root (str): The history directory
+    Returns:
+        pandas.DataFrame: The (days x model categories) net sales indexed by date
+    """
+    mapped = [category for category, target in category_map.items() if target is not None]
+    totals = []
+    for batch in iter_history(['date', 'Category Name', 'Net Sales'], stores, start, end, mapped, root=root):
+        batch['category'] = batch['Category Name'].map(category_map)
+        totals.append(batch.groupby(['date', 'category'])['Net Sales'].sum())
+
+    if not totals:
+        return pd.DataFrame()
+
+    daily = pd.concat(totals).groupby(level=['date', 'category']).sum().unstack('category', fill_value=0)
+    return daily.rename_axis(index=None, columns=None)
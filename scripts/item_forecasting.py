@@ -0,0 +1,193 @@
+# Description: This file contains the item (SKU) level forecasting engine. Item sales from the POS item exports are
+# pivoted to a dense (days x items) matrix, every item gets a weekday-profile base forecast, and the item forecasts are
+# reconciled to the Coffee / Without Coffee / Food model forecasts with vectorized group operations, so the cost grows
+# linearly with the size of the menu. Forecasted quantities (units sold) are derived from the reconciled sales.
+
+import numpy as np
+import pandas as pd
+
+# POS category -> model category (None: not forecasted by the category models)
+CATEGORY_MAP = {
+    'Coffee Hot - Café Chaud': 'Coffee',
+    'Coffee Cold - Café Froid': 'Coffee',
+    'Sans Café - Without Coffee': 'Without Coffee',
+    'Desserts': 'Food',
+    'Menu Spécial': 'Food',
+    'Uncategorized': 'Food',
+    'Birthday Menu': 'Coffee',
+    'Coffee Beans & Chocolat': None,
+    'Merch': None
+}
+
+# Item panel
+# ------------------------------------------------------------------------------
+def item_panel(items, category_map=CATEGORY_MAP) -> dict:
+    """
+    Pivots long item sales rows to dense daily matrices, with zero sales on the days an item is missing.
+    Parameters:
+        items (pandas.DataFrame): Item rows with 'Category Name', 'Name', 'Net Sales', 'Sold' and 'date'
+                                  (e.g. from merge_all_sales('data/Item Sales/...'))
+        category_map (dict): POS category -> model category, items of categories mapped to None are dropped,
+                             and so are the items of categories missing from the map, which are reported
+    Returns:
+        dict: 'sales' and 'sold' (days x items float32 arrays), 'dates', 'items' (item names) and
+              'categories' (model category of every item)
+    """
+    # Map the few distinct POS categories instead of every row
+    category_codes, pos_categories = pd.factorize(items['Category Name'])
+    model_categories = pd.Series(pos_categories).map(category_map).to_numpy(dtype=object)
+    unknown = [category for category in pos_categories if category not in category_map]
+    if unknown:
+        print(f"Dropping the items of POS categories missing from the category map: {unknown}")
+    mapped = (category_codes >= 0) & pd.notna(model_categories)[category_codes]
+    row_categories = category_codes[mapped]
+
+    item_codes, names = pd.factorize(items['Name'].to_numpy()[mapped], sort=True)
+    row_dates = pd.DatetimeIndex(items['date'].to_numpy()[mapped]).normalize()
+    dates = pd.date_range(row_dates.min(), row_dates.max(), freq='D')
+    day_codes = (row_dates - dates[0]).days.to_numpy()
+
+    # An item keeps the category it was sold under most recently: last row of each item by date
+    order = np.lexsort((day_codes, item_codes))
+    last = np.r_[item_codes[order][1:] != item_codes[order][:-1], True]
+    categories = model_categories[row_categories[order][last]]
+
+    # Scatter-add every row into its (day, item) cell, duplicate rows are summed
+    cells = day_codes * len(names) + item_codes
+    size = len(dates) * len(names)
+    sales = np.bincount(cells, weights=items['Net Sales'].to_numpy(dtype=float)[mapped], minlength=size)
+    sold = np.bincount(cells, weights=items['Sold'].to_numpy(dtype=float)[mapped], minlength=size)
+
+    return {
+        'sales': sales.reshape(len(dates), len(names)).astype(np.float32),
+        'sold': sold.reshape(len(dates), len(names)).astype(np.float32),
+        'dates': dates,
+        'items': list(names),
+        'categories': categories
+    }
+
+# Base forecasts
+# ------------------------------------------------------------------------------
+def weekday_profile(values, dates, weeks=8) -> np.ndarray:
+    """
+    Mean value of every item on each weekday over the last weeks of history.
+    Parameters:
+        values (numpy.ndarray): The (days x items) history
+        dates (pandas.DatetimeIndex): The daily dates of the history
+        weeks (int): Number of most recent weeks averaged
+    Returns:
+        numpy.ndarray: The (7 x items) profile indexed by dayofweek (Monday = 0)
+    """
+    recent = values[-weeks * 7:]
+    recent_days = dates[-weeks * 7:].dayofweek.to_numpy()
+
+    totals = np.zeros((7, values.shape[1]), dtype=float)
+    np.add.at(totals, recent_days, recent)
+    counts = np.bincount(recent_days, minlength=7)
+
+    return (totals / np.maximum(counts, 1)[:, np.newaxis]).astype(np.float32)
+
+
+def base_item_forecast(panel, forecast_dates, weeks=8) -> np.ndarray:
+    """
+    Forecasts the sales of every item with its weekday profile.
+    Parameters:
+        panel (dict): Output of item_panel
+        forecast_dates (pandas.DatetimeIndex): The forecasted dates
+        weeks (int): Number of most recent weeks in the profile
+    Returns:
+        numpy.ndarray: The (forecast days x items) float32 sales forecasts
+    """
+    profile = weekday_profile(panel['sales'], panel['dates'], weeks)
+    return profile[pd.DatetimeIndex(forecast_dates).dayofweek.to_numpy()]
+
+# Reconciliation
+# ------------------------------------------------------------------------------
+def reconcile(item_forecast, category_forecast, item_groups, n_groups, method='proportional', shares=None):
+    """
+    Reconciles item forecasts with category forecasts so the items add up to their category.
+    With 'proportional' (top-down), the category forecast is split in the proportions of the item forecasts
+    (or of the historical shares when the items of a category forecast zero).
+    With 'ols', the OLS reconciliation of the two-level hierarchy is used: the closed form of
+    (S'S)^-1 S' adds (category - sum of items) / (items + 1) to every item of the category, so the
+    category total becomes a combination of the model and the item forecasts.
+    Parameters:
+        item_forecast (numpy.ndarray): The (days x items) item forecasts
+        category_forecast (numpy.ndarray): The (days x groups) category forecasts
+        item_groups (numpy.ndarray): Group index of every item
+        n_groups (int): Number of groups
+        method (str): 'proportional' or 'ols'
+        shares (numpy.ndarray, optional): Historical share of every item in its group
+    Returns:
+        numpy.ndarray: The (days x items) reconciled item forecasts
+    """
+    item_forecast = np.asarray(item_forecast, dtype=float)
+    category_forecast = np.asarray(category_forecast, dtype=float)
+
+    # (days x groups) sums of the item forecasts
+    item_totals = np.zeros((len(item_forecast), n_groups))
+    np.add.at(item_totals.T, item_groups, item_forecast.T)
+
+    if method == 'proportional':
+        weights = item_forecast / np.where(item_totals > 0, item_totals, 1)[:, item_groups]
+        if shares is not None:
+            weights = np.where(item_totals[:, item_groups] > 0, weights, shares)
+        return weights * category_forecast[:, item_groups]
+
+    if method == 'ols':
+        group_sizes = np.bincount(item_groups, minlength=n_groups)
+        adjustment = (category_forecast - item_totals) / (group_sizes + 1)
+        return item_forecast + adjustment[:, item_groups]
+
+    raise ValueError(f"Unknown reconciliation method: {method}")
+
+# Engine
+# ------------------------------------------------------------------------------
+def forecast_items(items, category_forecast, category_map=CATEGORY_MAP, weeks=8, method='proportional') -> dict:
+    """
+    Forecasts the sales and quantities of every item, reconciled with the category model forecasts.
+    Parameters:
+        items (pandas.DataFrame): Item sales rows, see item_panel
+        category_forecast (pandas.DataFrame): Category forecasts indexed by date with one column per model
+                                              category (e.g. the dashboard predictions)
+        category_map (dict): POS category -> model category
+        weeks (int): Number of most recent weeks in the item weekday profiles
+        method (str): Reconciliation method, 'proportional' or 'ols' (see reconcile)
+    Returns:
+        dict: 'sales' and 'quantities' (forecast days x items DataFrames, quantities in units sold) and
+              'categories' (the category totals of the reconciled items)
+    """
+    panel = item_panel(items, category_map)
+    groups = [category for category in category_forecast.columns if category in set(panel['categories'])]
+    keep = np.isin(panel['categories'], groups)
+    item_groups = pd.Index(groups).get_indexer(panel['categories'][keep])
+    names = [name for name, kept in zip(panel['items'], keep) if kept]
+
+    sales_history = panel['sales'][:, keep]
+    sold_history = panel['sold'][:, keep]
+    forecast_dates = pd.DatetimeIndex(pd.to_datetime(category_forecast.index))
+
+    base = base_item_forecast({**panel, 'sales': sales_history}, forecast_dates, weeks)
+
+    # Historical share of every item in its category, used when a category has no recent item sales
+    item_sales = sales_history.sum(axis=0, dtype=float)
+    group_sales = np.bincount(item_groups, weights=item_sales, minlength=len(groups))
+    shares = item_sales / np.where(group_sales > 0, group_sales, 1)[item_groups]
+
+    sales = reconcile(base, category_forecast[groups].to_numpy(dtype=float), item_groups, len(groups),
+                      method=method, shares=shares)
+    sales = np.maximum(sales, 0)
+
+    # Units sold from the average net price of every item
+    item_sold = sold_history.sum(axis=0, dtype=float)
+    unit_price = np.divide(item_sales, item_sold, out=np.full(len(names), np.nan), where=item_sold > 0)
+    quantities = np.divide(sales, unit_price, out=np.zeros_like(sales), where=unit_price > 0)
+
+    reconciled_totals = np.zeros((len(sales), len(groups)))
+    np.add.at(reconciled_totals.T, item_groups, sales.T)
+
+    return {
+        'sales': pd.DataFrame(sales, index=category_forecast.index, columns=names),
+        'quantities': pd.DataFrame(quantities, index=category_forecast.index, columns=names),
+        'categories': pd.DataFrame(reconciled_totals, index=category_forecast.index, columns=groups)
+    }
@@ -0,0 +1,67 @@
+# Description: This file contains the registry of the store locations: coordinates for the weather, Calendarific
+# country and region for the holidays, pedestrianization windows and the sales models of every store.
+
+# Store used when no location is given
+DEFAULT_LOCATION = 'montreal'
+
+LOCATIONS = {
+    'montreal': {
+        'lat': 45.47,
+        'lon': -73.74,
+        'alt': 32,
+        'country': 'ca',
+        'region': 'ca-qc',
+        'pedestrianization': [('2025-06-01', '2025-09-30')],
+        'models': {
+            'Coffee': 'sales_models/xgb_model_Coffee.pkl',
+            'Without Coffee': 'sales_models/xgb_model_Without_Coffee.pkl',
+            'Food': 'sales_models/xgb_model_Food.pkl'
+        }
+    }
+}
+
+# Registry
+# ------------------------------------------------------------------------------
+def register_location(name, lat, lon, alt=None, country='ca', region='ca-qc', pedestrianization=(), models=None):
+    """
+    Adds or replaces a store location.
+    Parameters:
+        name (str): Name of the store
+        lat (float): Latitude of the store
+        lon (float): Longitude of the store
+        alt (float, optional): Altitude of the store
+        country (str): Calendarific country code of the holidays
+        region (str): Calendarific location code of the holidays (e.g. 'ca-qc')
+        pedestrianization (list): (start, end) pedestrianization windows in 'YYYY-MM-DD' format
+        models (dict, optional): Category -> model path, defaults to the models of the default store
+    Returns:
+        dict: The registered location
+    """
+    LOCATIONS[name] = {
+        'lat': lat,
+        'lon': lon,
+        'alt': alt,
+        'country': country,
+        'region': region,
+        'pedestrianization': list(pedestrianization),
+        'models': dict(models or LOCATIONS[DEFAULT_LOCATION]['models'])
+    }
+    return LOCATIONS[name]
+
+
+def get_location(location=None) -> dict:
+    """
+    Resolves a location name (or an already resolved location) to its registry entry.
+    Parameters:
+        location (str or dict, optional): Store name or location dict, the default store if None
+    Returns:
+        dict: The location
+    Raises:
+        KeyError: If the store is not registered.
+    """
+    if isinstance(location, dict):
+        return location
+    name = location or DEFAULT_LOCATION
+    if name not in LOCATIONS:
+        raise KeyError(f"Unknown location: {name}. Registered locations: {list(LOCATIONS)}")
+    return LOCATIONS[name]
@@ -0,0 +1,62 @@
+# Description: This file contains the vectorized evaluation metrics. Many prediction sets (models, candidates, folds)
+# stacked as columns are scored in one NumPy pass and returned as a tidy DataFrame.
+
+import numpy as np
+import pandas as pd
+
+# Accuracy ranges ($) reported for every model
+DEFAULT_THRESHOLDS = (20, 50, 100)
+
+def batch_metrics(y_true, y_pred, thresholds=DEFAULT_THRESHOLDS, names=None) -> pd.DataFrame:
+    """
+    Computes MSE, RMSE, MAE, R2, MAPE and the accuracy within each threshold of many prediction sets at once.
+    NaN values (in either array) are ignored and MAPE excludes zero actual values, like calculate_mape.
+    Parameters:
+        y_true (array-like): Actual values, (n_samples,) shared by every set or (n_samples x n_sets)
+        y_pred (array-like): Predictions, (n_samples,) or (n_samples x n_sets)
+        thresholds (iterable): Ranges for the 'accuracy_<threshold>' metrics (% of predictions within the range)
+        names (list, optional): Name of each prediction set, defaults to the DataFrame columns or 0..n_sets-1
+    Returns:
+        pandas.DataFrame: One row per prediction set and one column per metric
+    """
+    if names is None and isinstance(y_pred, pd.DataFrame):
+        names = list(y_pred.columns)
+
+    y_pred = np.asarray(y_pred, dtype=float)
+    y_pred = y_pred.reshape(len(y_pred), -1)
+    y_true = np.asarray(y_true, dtype=float).reshape(len(y_pred), -1)
+    y_true = np.broadcast_to(y_true, y_pred.shape)
+
+    valid = ~(np.isnan(y_true) | np.isnan(y_pred))
+    count = valid.sum(axis=0)
+    errors = np.where(valid, y_true - y_pred, 0.0)
+    abs_errors = np.abs(errors)
+    actual = np.where(valid, y_true, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mse = (errors ** 2).sum(axis=0) / count
+
+        # R2 against the mean of the actual values, with the sklearn convention for constant targets
+        actual_mean = actual.sum(axis=0) / count
+        total = (np.where(valid, y_true - actual_mean, 0.0) ** 2).sum(axis=0)
+        residual = (errors ** 2).sum(axis=0)
+        r2 = np.where(total > 0, 1 - residual / np.where(total > 0, total, 1), np.where(residual == 0, 1.0, 0.0))
+
+        nonzero = valid & (actual != 0)
+        mape = np.where(nonzero, abs_errors / np.abs(np.where(nonzero, actual, 1.0)), 0.0).sum(axis=0) / nonzero.sum(axis=0) * 100
+
+        thresholds = np.asarray(list(thresholds), dtype=float)
+        within = ((abs_errors[:, :, np.newaxis] <= thresholds) & valid[:, :, np.newaxis]).sum(axis=0)
+        accuracy = within / count[:, np.newaxis] * 100
+
+    metrics = pd.DataFrame({
+        'mse': mse,
+        'rmse': np.sqrt(mse),
+        'mae': abs_errors.sum(axis=0) / count,
+        'r2': r2,
+        'mape': mape
+    }, index=names)
+    for i, threshold in enumerate(thresholds):
+        metrics[f'accuracy_{threshold:g}'] = accuracy[:, i]
+
+    return metrics
@@ -6,14 +6,26 @@ import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 
-from sklearn.model_selection import GridSearchCV, TimeSeriesSplit, train_test_split
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from sklearn.model_selection import GridSearchCV, TimeSeriesSplit, train_test_split, ParameterGrid
+from sklearn.base import clone
+from sklearn.metrics import mean_squared_error, make_scorer
 from typing import List, Dict, Tuple
 from sklearn.linear_model import Ridge
 from sklearn.compose import TransformedTargetRegressor
 from sklearn.preprocessing import FunctionTransformer
 
+import math
+import os
+import time
 import warnings
+from copy import deepcopy
+from datetime import datetime
+import dill
+from joblib import Parallel, delayed, cpu_count, effective_n_jobs, parallel_config
+from threadpoolctl import threadpool_limits
+from scripts.metrics import batch_metrics
+from scripts.artifacts import (artifact_key, estimator_fingerprint, load_artifact, save_artifact, publish_models,
+                               write_model, read_lineage, record_lineage)
 
 def analyze_category_feature_importance(
     data: pd.DataFrame, 
@@ -128,242 +140,828 @@ def log_transform(x):
 def inverse_log_transform(x):
     return np.expm1(x)
 
-def xgb_train_log(df, categories, n_splits, xgb_params, random_state=42, date_split='2024-11-16'):
+def xgb_estimator(random_state, n_threads):
+    """Estimator factory for the XGBoost models."""
+    return xgb.XGBRegressor(random_state=random_state, n_jobs=n_threads)
+
+def ridge_estimator(random_state, n_threads):
+    """Estimator factory for the Ridge models."""
+    return Ridge(random_state=random_state)
+
+def log_target_pipeline(regressor):
     """
-    Similar to ridge_train, but uses a TransformedTargetRegressor with log1p/expm1
-    so that the target is log-transformed during training.
+    Builds the scaler + log1p/expm1 target-transformed pipeline shared by every model family.
     """
-    results = {}
-    residuals = {}
-    best_models = {}
-    
     transformer = FunctionTransformer(func=log_transform, inverse_func=inverse_log_transform)
 
-    for category in categories:
-        # Prepare data
-        X = df.drop(categories, axis=1)
-        y = df[category]
+    return Pipeline([
+        ('scaler', StandardScaler()),
+        ('model', TransformedTargetRegressor(
+            regressor=regressor,
+            transformer=transformer
+        ))
+    ])
+
+def regression_metrics(y_true, y_pred):
+    """
+    Calculate the evaluation metrics on the original scale
+    """
+    return batch_metrics(y_true, y_pred).iloc[0].to_dict()
+
+def print_metrics(category, train_metrics, test_metrics):
+    """
+    Print the main train and test metrics of a category
+    """
+    print(f"\nMetrics for {category}:")
+    print("Training Metrics:")
+    print(f"RMSE: {train_metrics['rmse']:.4f}")
+    print(f"MAPE: {train_metrics['mape']:.4f}")
+    print(f"R2: {train_metrics['r2']:.4f}")
+    print("\nTest Metrics:")
+    print(f"RMSE: {test_metrics['rmse']:.4f}")
+    print(f"MAPE: {test_metrics['mape']:.4f}")
+    print(f"R2: {test_metrics['r2']:.4f}")
+
+# Summary columns of each metrics set
+SUMMARY_COLUMNS = {
+    'train_metrics': {'rmse': 'Train RMSE', 'mape': 'Train MAPE', 'r2': 'Train R2', 'accuracy_20': 'Train Accuracy 20',
+                      'accuracy_50': 'Train Accuracy 50', 'accuracy_100': 'Train Accuracy 100'},
+    'test_metrics': {'rmse': 'Test RMSE', 'mape': 'Test MAPE', 'r2': 'Test R2', 'accuracy_20': 'Test Accuracy 20',
+                     'accuracy_50': 'Test Accuracy 50', 'accuracy_100': 'Test Accuracy 100'}
+}
+
+def summary_frame(results):
+    """
+    Build the summary DataFrame of the train, test and CV metrics of every category
+    """
+    summary = pd.concat(
+        [pd.DataFrame.from_dict({cat: result[metrics] for cat, result in results.items()}, orient='index')
+         [list(columns)].rename(columns=columns)
+         for metrics, columns in SUMMARY_COLUMNS.items()],
+        axis=1
+    )
+    summary['CV RMSE'] = [result['best_score'] for result in results.values()]
+    summary = summary.rename_axis('Category').reset_index()
+
+    return summary[['Category', 'Train RMSE', 'Train MAPE', 'Train R2', 'Train Accuracy 20', 'Train Accuracy 50',
+                    'Train Accuracy 100', 'Test RMSE', 'Test MAPE', 'Test R2', 'CV RMSE', 'Test Accuracy 20',
+                    'Test Accuracy 50', 'Test Accuracy 100']]
+
+# Fold bank
+
+# Prefix of the regressor parameters in the log-target pipeline
+REGRESSOR_PREFIX = 'model__regressor__'
+
+def build_fold_bank(X, Y, cv):
+    """
+    Precomputes the scaled features and log1p targets of every CV fold once, so the candidates
+    and categories of a search only fit the regressor on them.
+
+    Args:
+        X: Training features
+        Y: DataFrame of the training targets (one column per category)
+        cv: Cross-validation splitter
+
+    Returns:
+        List with one dict per fold: scaled 'X_train'/'X_val' arrays, 'Y_train_log' and 'Y_val'
+        target arrays and the 'targets' column names
+    """
+    bank = []
+    for train_idx, val_idx in cv.split(X):
+        scaler = StandardScaler().fit(X.iloc[train_idx])
+        bank.append({
+            'X_train': scaler.transform(X.iloc[train_idx]),
+            'X_val': scaler.transform(X.iloc[val_idx]),
+            'Y_train_log': log_transform(Y.iloc[train_idx].to_numpy(dtype=float)),
+            'Y_val': Y.iloc[val_idx].to_numpy(dtype=float),
+            'targets': list(Y.columns)
+        })
+    return bank
+
+def _bank_compatible(param_grid):
+    """Whether every parameter of a grid belongs to the regressor, so the fold bank can be used"""
+    return all(name.startswith(REGRESSOR_PREFIX) for params in ParameterGrid(param_grid) for name in params)
+
+def _bank_cv_rmse(regressor, params, bank, target, early_stopping_rounds=None):
+    """
+    Mean validation RMSE of a candidate over the folds of a fold bank.
+    Returns the RMSE and, with early stopping, the mean number of boosting rounds kept.
+    """
+    rmses = []
+    rounds = []
+    for fold in bank:
+        column = fold['targets'].index(target)
+        model = clone(regressor).set_params(**{name[len(REGRESSOR_PREFIX):]: value for name, value in params.items()})
+
+        fit_params = {}
+        if early_stopping_rounds and isinstance(model, xgb.XGBModel):
+            model.set_params(early_stopping_rounds=early_stopping_rounds)
+            fit_params = {'eval_set': [(fold['X_val'], log_transform(fold['Y_val'][:, column]))], 'verbose': False}
+
+        model.fit(fold['X_train'], fold['Y_train_log'][:, column], **fit_params)
+        y_pred = inverse_log_transform(model.predict(fold['X_val']))
+        rmses.append(np.sqrt(mean_squared_error(fold['Y_val'][:, column], y_pred)))
+        if fit_params:
+            rounds.append(model.best_iteration + 1)
+
+    return np.mean(rmses), (int(np.mean(rounds)) if rounds else None)
+
+def fold_bank_grid_search(pipeline, param_grid, X, y, bank, target, n_jobs=1):
+    """
+    Exhaustive grid search equivalent to GridSearchCV on the log-target pipeline, scoring the
+    candidates on a precomputed fold bank instead of re-scaling and re-transforming every fold.
+
+    Returns:
+        Tuple of (best_estimator, best_params, best_score)
+    """
+    regressor = pipeline.named_steps['model'].regressor
+    candidates = list(ParameterGrid(param_grid))
+    scores = Parallel(n_jobs=n_jobs, backend='threading')(
+        delayed(_bank_cv_rmse)(regressor, params, bank, target) for params in candidates
+    )
+
+    # First best candidate, as in GridSearchCV
+    best = int(np.argmin([score for score, _ in scores]))
+    best_params = candidates[best]
+    best_estimator = clone(pipeline).set_params(**best_params).fit(X, y)
+
+    return best_estimator, best_params, scores[best][0]
+
+# Adaptive search
+
+def _is_xgb(pipeline):
+    """Whether the regressor of a log-target pipeline is an XGBoost model"""
+    return isinstance(pipeline.named_steps['model'].regressor, xgb.XGBModel)
+
+def _cv_rmse(pipeline, params, X, y, cv, resource, amount, early_stopping_rounds, bank=None, target=None):
+    """
+    Mean validation RMSE of a candidate over the CV folds with a given resource amount.
+    Returns the RMSE and, with early stopping, the mean number of boosting rounds kept.
+    Boosting-round resources are scored on the fold bank when one is given.
+    """
+    if bank is not None and resource != 'n_samples':
+        return _bank_cv_rmse(pipeline.named_steps['model'].regressor, {**params, resource: amount},
+                             bank, target, early_stopping_rounds)
+
+    rmses = []
+    rounds = []
+    for train_idx, val_idx in cv.split(X):
+        if resource == 'n_samples':
+            # Keep the most recent part of the training fold
+            train_idx = train_idx[-max(1, int(round(len(train_idx) * amount))):]
+        X_tr, y_tr = X.iloc[train_idx], y.iloc[train_idx]
+        X_val, y_val = X.iloc[val_idx], y.iloc[val_idx]
+
+        model = clone(pipeline).set_params(**params)
+        if resource != 'n_samples':
+            model.set_params(**{resource: amount})
+
+        fit_params = {}
+        if early_stopping_rounds and _is_xgb(model):
+            # The eval set goes straight to XGBoost, so it is scaled and log transformed like the training data
+            scaler = clone(model.named_steps['scaler']).fit(X_tr)
+            model.set_params(model__regressor__early_stopping_rounds=early_stopping_rounds)
+            fit_params = {'model__eval_set': [(scaler.transform(X_val), log_transform(y_val))],
+                          'model__verbose': False}
+
+        model.fit(X_tr, y_tr, **fit_params)
+        rmses.append(np.sqrt(mean_squared_error(y_val, model.predict(X_val))))
+        if fit_params:
+            rounds.append(model.named_steps['model'].regressor_.best_iteration + 1)
+
+    return np.mean(rmses), (int(np.mean(rounds)) if rounds else None)
+
+def successive_halving_search(pipeline, param_grid, X, y, cv, factor=3, resource=None, max_resource=None,
+                              min_resource=1, early_stopping_rounds=None, time_budget=None, n_jobs=1,
+                              bank=None, target=None):
+    """
+    Successive halving over a parameter grid: every candidate is scored on the CV folds with a small
+    resource, the best 1/factor are kept and the resource is multiplied by factor until one is left.
+
+    The resource is the number of boosting rounds for XGBoost pipelines and the (most recent) fraction
+    of each training fold otherwise. With early_stopping_rounds, XGBoost candidates stop boosting once
+    the validation fold stops improving and the refit uses the mean number of rounds kept. The CV score
+    is then slightly optimistic since the validation fold also picks the rounds.
+    When time_budget (seconds) runs out, the best candidate evaluated so far is refit.
 
-        X_train = X[X.index <= date_split]
-        y_train = y[y.index <= date_split]
-        X_test = X[X.index > date_split]
-        y_test = y[y.index > date_split]
+    Args:
+        pipeline: The log-target pipeline to tune
+        param_grid: Dict of parameter name -> list of values
+        X, y: Training features and target
+        cv: Cross-validation splitter
+        factor: Fraction of candidates eliminated (and resource growth) per round
+        resource: 'n_samples' or the name of a pipeline parameter, defaults to the XGBoost n_estimators
+        max_resource: Resource of the last round, defaults to the largest grid value of the resource
+            (500 if absent) or 1.0 for 'n_samples'
+        min_resource: Smallest resource of a round
+        early_stopping_rounds: XGBoost early stopping patience on the validation fold
+        time_budget: Wall-clock budget of the search in seconds
+        n_jobs: Number of threads scoring candidates in parallel
+        bank, target: Optional fold bank (see build_fold_bank) and target column it is scored on
+
+    Returns:
+        Tuple of (best_estimator, best_params, best_score)
+    """
+    start = time.perf_counter()
+    out_of_time = lambda: time_budget is not None and time.perf_counter() - start > time_budget
+
+    if resource is None:
+        resource = 'model__regressor__n_estimators' if _is_xgb(pipeline) else 'n_samples'
+
+    # The resource is set by the search, so it is removed from the candidates
+    candidates = []
+    grid_values = []
+    for params in ParameterGrid(param_grid):
+        if resource in params:
+            grid_values.append(params.pop(resource))
+        if params not in candidates:
+            candidates.append(params)
+
+    if resource == 'n_samples':
+        max_resource = max_resource or 1.0
+    else:
+        max_resource = max_resource or (max(grid_values) if grid_values else 500)
+
+    # Number of rounds until a single candidate is left
+    n_rounds = 1
+    remaining = len(candidates)
+    while remaining > 1:
+        remaining = math.ceil(remaining / factor)
+        n_rounds += 1
+
+    # Batches of candidates scored in parallel, n_jobs may be negative like in joblib
+    n_jobs = effective_n_jobs(n_jobs)
+
+    for round_ in range(n_rounds):
+        amount = max_resource * factor ** (round_ - n_rounds + 1)
+        amount = amount if resource == 'n_samples' else max(int(round(amount)), min_resource)
+
+        scores = []
+        for batch_start in range(0, len(candidates), n_jobs):
+            if scores and out_of_time():
+                break
+            batch = candidates[batch_start:batch_start + n_jobs]
+            batch_scores = Parallel(n_jobs=n_jobs, backend='threading')(
+                delayed(_cv_rmse)(pipeline, params, X, y, cv, resource, amount, early_stopping_rounds,
+                                  bank=bank, target=target)
+                for params in batch
+            )
+            scores.extend(zip(batch, batch_scores))
+
+        ranked = sorted(scores, key=lambda candidate: candidate[1][0])
+        best_params, (best_score, best_rounds) = ranked[0]
+        best_amount = amount
+
+        if out_of_time():
+            break
+        candidates = [params for params, _ in ranked[:max(1, math.ceil(len(ranked) / factor))]]
+
+    # Refit the best candidate on the whole training set
+    best_params = dict(best_params)
+    if resource != 'n_samples':
+        best_params[resource] = best_rounds or best_amount
+    best_estimator = clone(pipeline).set_params(**best_params).fit(X, y)
+
+    return best_estimator, best_params, best_score
+
+# Training engine
+
+def _fit_category(X_train, y_train, X_test, y_test, estimator_factory, params, n_splits, random_state, n_threads,
+                  search='grid', search_options=None, bank=None):
+    """
+    Searches the hyperparameters of the log-target pipeline of one category inside a training worker.
+    The worker uses at most n_threads threads for the candidate fits and the native libraries.
+    Candidates are scored on the fold bank when one is given and the grid only tunes the regressor.
+    """
+    # Same seed in every worker so results do not depend on the scheduling
+    np.random.seed(random_state)
+
+    # Time series CV
+    tcsv = TimeSeriesSplit(n_splits=n_splits, test_size=14, gap=0)
+
+    pipeline = log_target_pipeline(estimator_factory(random_state, 1))
+
+    # Candidates run on threads of this worker, native thread pools are limited to one thread each
+    with threadpool_limits(limits=1), parallel_config(backend='threading'):
+        # Train the model with warnings suppressed
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=RuntimeWarning)
+            if bank is not None and not _bank_compatible(params):
+                bank = None
+
+            if search == 'halving':
+                best_estimator, best_params, best_score = successive_halving_search(
+                    pipeline, params, X_train, y_train, tcsv, n_jobs=n_threads, bank=bank, target=y_train.name,
+                    **(search_options or {})
+                )
+            elif bank is not None:
+                best_estimator, best_params, best_score = fold_bank_grid_search(
+                    pipeline, params, X_train, y_train, bank, y_train.name, n_jobs=n_threads
+                )
+            else:
+                grid_search = GridSearchCV(
+                    estimator=pipeline,
+                    param_grid=params,
+                    scoring='neg_root_mean_squared_error',
+                    cv=tcsv,
+                    refit=True,
+                    n_jobs=n_threads,
+                    verbose=False
+                )
+                grid_search.fit(X_train, y_train)
+                best_estimator = grid_search.best_estimator_
+                best_params, best_score = grid_search.best_params_, -grid_search.best_score_
+
+        y_pred_train = best_estimator.predict(X_train)
+        y_pred_test = best_estimator.predict(X_test)
+
+    result = {
+        'best_params': best_params,
+        'best_score': best_score,
+        'train_metrics': regression_metrics(y_train, y_pred_train),
+        'test_metrics': regression_metrics(y_test, y_pred_test)
+    }
+
+    # Residuals in original scale
+    residual = {
+        'train_residuals': y_train - y_pred_train,
+        'test_residuals': y_test - y_pred_test
+    }
+
+    return result, residual, best_estimator
+
+def train_model_families(df, categories, n_splits, families, random_state=42, date_split='2024-11-16',
+                         n_workers=None, verbose=True, search='grid', search_options=None, fold_cache=True,
+                         artifact_store=None, publish=None, model_dir='sales_models'):
+    """
+    Trains every (model family, category) pair in parallel worker processes.
+    Each family uses the scaler + log-target pipeline and a hyperparameter search over TimeSeriesSplit folds.
+
+    Args:
+        df: DataFrame containing features and target categories
+        categories: List of target category columns
+        n_splits: Number of TimeSeriesSplit folds
+        families: Dict of family name -> (estimator_factory, param_grid); the factory is called with
+            (random_state, n_threads) and returns an unfitted regressor
+        random_state: Seed passed to every estimator
+        date_split: Last date of the training set
+        n_workers: Number of worker processes, defaults to one per task up to the number of cores
+        verbose: Print the metrics of every category
+        search: 'grid' for an exhaustive GridSearchCV or 'halving' for successive_halving_search
+        search_options: Keyword arguments of successive_halving_search (factor, early_stopping_rounds,
+            time_budget, ...); the time budget applies to each (family, category) search
+        fold_cache: Scale the features and log-transform the targets of every CV fold once and share
+            them across every candidate, category and family (see build_fold_bank)
+        artifact_store: Directory of the content-addressed artifact store (see scripts/artifacts.py); families
+            whose training frame, features, parameter grid and library versions match a stored run are
+            loaded instead of retrained, and new runs are stored
+        publish: Dict of family name -> model file prefix (e.g. {'xgb': 'xgb_model'}); the best models of these
+            families are written to model_dir with their artifact key in its lineage file (see publish_models)
+        model_dir: Directory of the published models
+
+    Returns:
+        Dict of family name -> (results, summary_df, residuals, best_models); the result of every category
+        holds the 'artifact_key' of its training run
+    """
+    # Prepare data once for every task
+    X = df.drop(categories, axis=1)
+    train_mask = X.index <= date_split
+    X_train, X_test = X[train_mask], X[~train_mask]
+
+    # Every family is keyed by its inputs, families already trained on the same inputs are served from the store
+    keys = {
+        family: artifact_key(df, X.columns, {
+            **estimator_fingerprint(estimator_factory),
+            'param_grid': params, 'categories': list(categories), 'n_splits': n_splits,
+            'random_state': random_state, 'date_split': date_split, 'search': search,
+            'search_options': search_options
+        })
+        for family, (estimator_factory, params) in families.items()
+    }
+    cached = {}
+    if artifact_store is not None:
+        for family in families:
+            artifact = load_artifact(keys[family], root=artifact_store)
+            if artifact is not None:
+                if verbose:
+                    print(f"{family}: loaded artifact {keys[family]}")
+                cached[family] = artifact
+
+    tasks = [(family, category) for family in families if family not in cached for category in categories]
+    if tasks:
+        cached.update(_train_tasks(df, categories, n_splits, families, tasks, X, train_mask, random_state,
+                                   n_workers, verbose, search, search_options, fold_cache))
+        if artifact_store is not None:
+            for family, _ in dict.fromkeys(tasks):
+                save_artifact(keys[family], cached[family], root=artifact_store, metadata={
+                    'family': family, 'categories': list(categories), 'features': list(X.columns),
+                    'param_grid': families[family][1], 'n_rows': len(df),
+                    'date_range': [str(df.index.min()), str(df.index.max())], 'date_split': date_split
+                })
+
+    for family in families:
+        for result in cached[family][0].values():
+            result['artifact_key'] = keys[family]
+
+    for family, prefix in (publish or {}).items():
+        paths = publish_models(cached[family][3], keys[family], directory=model_dir, prefix=prefix)
+        if verbose:
+            print(f"{family}: published {', '.join(paths.values())} from artifact {keys[family]}")
+
+    return {family: cached[family] for family in families}
+
+def _train_tasks(df, categories, n_splits, families, tasks, X, train_mask, random_state, n_workers, verbose,
+                 search, search_options, fold_cache):
+    """
+    Runs the (family, category) training tasks of train_model_families in parallel worker processes.
 
-        # Time series CV
+    Returns:
+        Dict of family name -> (results, summary_df, residuals, best_models) of the trained families
+    """
+    X_train, X_test = X[train_mask], X[~train_mask]
+
+    # Fold-level preprocessing shared by every task
+    bank = None
+    if fold_cache:
         tcsv = TimeSeriesSplit(n_splits=n_splits, test_size=14, gap=0)
+        bank = build_fold_bank(X_train, df.loc[train_mask, categories], tcsv)
+
+    # Split the cores between the workers so they do not oversubscribe the machine
+    n_cores = cpu_count()
+    n_workers = min(n_workers or n_cores, len(tasks))
+    n_threads = max(1, n_cores // n_workers)
+
+    outputs = Parallel(n_jobs=n_workers, backend='loky')(
+        delayed(_fit_category)(
+            X_train, df.loc[train_mask, category], X_test, df.loc[~train_mask, category],
+            families[family][0], families[family][1], n_splits, random_state, n_threads,
+            search=search, search_options=search_options, bank=bank
+        )
+        for family, category in tasks
+    )
 
-        scaler = StandardScaler()
-        pipeline = Pipeline([
-            ('scaler', scaler),
-            ('model', TransformedTargetRegressor(
-                regressor=xgb.XGBRegressor(random_state=random_state),
-                transformer=transformer
-            ))
-        ])
+    trained = {family: ({}, {}, {}) for family, _ in dict.fromkeys(tasks)}
+    for (family, category), (result, residual, best_model) in zip(tasks, outputs):
+        results, residuals, best_models = trained[family]
+        results[category] = result
+        residuals[category] = residual
+        best_models[category] = best_model
 
-        
-        grid_search = GridSearchCV(
-            estimator=pipeline,
-            param_grid=xgb_params,
-            scoring='neg_root_mean_squared_error',
-            cv=tcsv,
-            refit=True,
-            n_jobs=-1,
-            verbose=False
+        if verbose:
+            print_metrics(category, result['train_metrics'], result['test_metrics'])
+
+    return {family: (results, summary_frame(results), residuals, best_models)
+            for family, (results, residuals, best_models) in trained.items()}
+
+def train_categories(df, categories, n_splits, estimator_factory, params, random_state=42,
+                     date_split='2024-11-16', n_workers=None, verbose=True, search='grid', search_options=None,
+                     fold_cache=True, artifact_store=None, publish_prefix=None, model_dir='sales_models'):
+    """
+    Trains one model family for every category in parallel, see train_model_families.
+    The best models are published to model_dir under publish_prefix when one is given.
+
+    Returns:
+        Tuple of (results, summary_df, residuals, best_models)
+    """
+    return train_model_families(df, categories, n_splits, {'model': (estimator_factory, params)},
+                                random_state=random_state, date_split=date_split, n_workers=n_workers,
+                                verbose=verbose, search=search, search_options=search_options,
+                                fold_cache=fold_cache, artifact_store=artifact_store,
+                                publish={'model': publish_prefix} if publish_prefix else None,
+                                model_dir=model_dir)['model']
+
+def xgb_train_log(df, categories, n_splits, xgb_params, random_state=42, date_split='2024-11-16', n_workers=None,
+                  search='grid', search_options=None, artifact_store=None, publish=False):
+    """
+    Similar to ridge_train, but uses a TransformedTargetRegressor with log1p/expm1
+    so that the target is log-transformed during training.
+    With publish=True the best models are written to sales_models/xgb_model_<category>.pkl with their lineage.
+    """
+    return train_categories(df, categories, n_splits, xgb_estimator, xgb_params,
+                            random_state=random_state, date_split=date_split, n_workers=n_workers,
+                            search=search, search_options=search_options, artifact_store=artifact_store,
+                            publish_prefix='xgb_model' if publish else None)
+
+def ridge_train_log(df, categories, n_splits, ridge_params, random_state=42, date_split='2024-11-16', n_workers=None,
+                    search='grid', search_options=None, artifact_store=None, publish=False):
+    """
+    Similar to ridge_train, but uses a TransformedTargetRegressor with log1p/expm1
+    so that the target is log-transformed during training.
+    With publish=True the best models are written to sales_models/ridge_model_<category>.pkl with their lineage.
+    """
+    return train_categories(df, categories, n_splits, ridge_estimator, ridge_params,
+                            random_state=random_state, date_split=date_split, n_workers=n_workers,
+                            search=search, search_options=search_options, artifact_store=artifact_store,
+                            publish_prefix='ridge_model' if publish else None)
+
+# Ridge regularization path
+
+def ridge_alpha_path(bank, alphas):
+    """
+    Mean validation RMSE of every alpha and category of the Ridge log-target model, computed in closed form.
+    The centered training matrix of each fold is factorized once (X = U S V^T) and the coefficients of every
+    alpha follow as V diag(s / (s^2 + alpha)) U^T y, for every category at once.
+
+    Args:
+        bank: Fold bank from build_fold_bank
+        alphas: Regularization strengths
+
+    Returns:
+        Array of the (alphas x categories) CV RMSE, with the categories in the bank 'targets' order
+    """
+    alphas = np.asarray(alphas, dtype=float)
+    rmses = []
+    for fold in bank:
+        X_mean = fold['X_train'].mean(axis=0)
+        Y_mean = fold['Y_train_log'].mean(axis=0)
+        U, s, Vt = np.linalg.svd(fold['X_train'] - X_mean, full_matrices=False)
+
+        # Drop the null directions (they only matter for alpha == 0, like lstsq)
+        keep = s > s.max() * max(fold['X_train'].shape) * np.finfo(float).eps
+        U, s, Vt = U[:, keep], s[keep], Vt[keep]
+
+        projected_val = (fold['X_val'] - X_mean) @ Vt.T          # (n_val x k)
+        projected_y = U.T @ (fold['Y_train_log'] - Y_mean)       # (k x categories)
+        shrinkage = s / (s ** 2 + alphas[:, np.newaxis])         # (alphas x k)
+
+        # (alphas x n_val x categories) predictions on the original scale
+        y_pred = inverse_log_transform(
+            np.einsum('vk,ak,kc->avc', projected_val, shrinkage, projected_y) + Y_mean
         )
-        
-        grid_search.fit(X_train, y_train)
-
-        y_pred_train = grid_search.predict(X_train)
-        y_pred_test = grid_search.predict(X_test)
-
-        # Evaluate metrics on original scale
-        train_metrics = {
-            'mse': mean_squared_error(y_train, y_pred_train),
-            'rmse': np.sqrt(mean_squared_error(y_train, y_pred_train)),
-            'mae': mean_absolute_error(y_train, y_pred_train),
-            'r2': r2_score(y_train, y_pred_train),
-            'mape': calculate_mape(y_train, y_pred_train),
-            'accuracy_20': accuracy_range(20, y_train, y_pred_train),
-            'accuracy_50': accuracy_range(50, y_train, y_pred_train),
-            'accuracy_100': accuracy_range(100, y_train, y_pred_train)
-        }
+        rmses.append(np.sqrt(np.mean((fold['Y_val'] - y_pred) ** 2, axis=1)))
 
-        test_metrics = {
-            'mse': mean_squared_error(y_test, y_pred_test),
-            'rmse': np.sqrt(mean_squared_error(y_test, y_pred_test)),
-            'mae': mean_absolute_error(y_test, y_pred_test),
-            'r2': r2_score(y_test, y_pred_test),
-            'mape': calculate_mape(y_test, y_pred_test),
-            'accuracy_20': accuracy_range(20, y_test, y_pred_test),
-            'accuracy_50': accuracy_range(50, y_test, y_pred_test),
-            'accuracy_100': accuracy_range(100, y_test, y_pred_test)
-        }
+    return np.mean(rmses, axis=0)
+
+def ridge_path_train_log(df, categories, n_splits, ridge_params, random_state=42, date_split='2024-11-16',
+                         verbose=True):
+    """
+    Same models as ridge_train_log, but the alpha grid is scored with ridge_alpha_path: one SVD per
+    fold for the whole alpha path and every category instead of one Ridge fit per (alpha, fold, category).
+    Only the best alpha of each category is refit on the full training set.
+
+    Args:
+        df: DataFrame containing features and target categories
+        categories: List of target category columns
+        n_splits: Number of TimeSeriesSplit folds
+        ridge_params: Parameter grid of the Ridge pipeline; only 'model__regressor__alpha' may have
+            several values
+        random_state: Seed passed to the estimator
+        date_split: Last date of the training set
+        verbose: Print the metrics of every category
+
+    Returns:
+        Tuple of (results, summary_df, residuals, best_models)
+    """
+    alpha_name = REGRESSOR_PREFIX + 'alpha'
+    fixed = {name: values[0] for name, values in ridge_params.items() if name != alpha_name}
+    if any(len(values) > 1 for name, values in ridge_params.items() if name != alpha_name):
+        raise ValueError(f"Only {alpha_name} can be searched on the closed-form Ridge path")
+    if fixed.get(REGRESSOR_PREFIX + 'fit_intercept', True) is not True:
+        raise ValueError("The closed-form Ridge path requires fit_intercept=True")
+    alphas = list(ridge_params.get(alpha_name, [Ridge().alpha]))
+
+    X = df.drop(categories, axis=1)
+    train_mask = X.index <= date_split
+    X_train, X_test = X[train_mask], X[~train_mask]
+
+    tcsv = TimeSeriesSplit(n_splits=n_splits, test_size=14, gap=0)
+    bank = build_fold_bank(X_train, df.loc[train_mask, categories], tcsv)
+    scores = ridge_alpha_path(bank, alphas)
+
+    results, residuals, best_models = {}, {}, {}
+    for c, category in enumerate(categories):
+        y_train, y_test = df.loc[train_mask, category], df.loc[~train_mask, category]
+
+        # First best alpha, as in GridSearchCV
+        best = int(np.argmin(scores[:, c]))
+        best_params = {alpha_name: alphas[best], **fixed}
+        best_estimator = log_target_pipeline(ridge_estimator(random_state, 1)).set_params(**best_params)
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=RuntimeWarning)
+            best_estimator.fit(X_train, y_train)
+
+        y_pred_train = best_estimator.predict(X_train)
+        y_pred_test = best_estimator.predict(X_test)
 
         results[category] = {
-            'best_params': grid_search.best_params_,
-            'best_score': -grid_search.best_score_, 
-            'train_metrics': train_metrics,
-            'test_metrics': test_metrics
+            'best_params': best_params,
+            'best_score': scores[best, c],
+            'train_metrics': regression_metrics(y_train, y_pred_train),
+            'test_metrics': regression_metrics(y_test, y_pred_test)
         }
-
-        # Residuals in original scale
         residuals[category] = {
             'train_residuals': y_train - y_pred_train,
             'test_residuals': y_test - y_pred_test
         }
+        best_models[category] = best_estimator
+
+        if verbose:
+            print_metrics(category, results[category]['train_metrics'], results[category]['test_metrics'])
 
-        best_models[category] = grid_search.best_estimator_
-
-        print(f"\nMetrics for {category}:")
-        print("Training Metrics:")
-        print(f"RMSE: {train_metrics['rmse']:.4f}")
-        print(f"MAPE: {train_metrics['mape']:.4f}")
-        print(f"R2: {train_metrics['r2']:.4f}")
-        print("\nTest Metrics:")
-        print(f"RMSE: {test_metrics['rmse']:.4f}")
-        print(f"MAPE: {test_metrics['mape']:.4f}")
-        print(f"R2: {test_metrics['r2']:.4f}")
-
-    # Build summary DataFrame
-    summary_df = pd.DataFrame({
-        'Category': list(results.keys()),
-        'Train RMSE': [results[cat]['train_metrics']['rmse'] for cat in results.keys()],
-        'Train MAPE': [results[cat]['train_metrics']['mape'] for cat in results.keys()],
-        'Train R2': [results[cat]['train_metrics']['r2'] for cat in results.keys()],
-        'Train Accuracy 20': [results[cat]['train_metrics']['accuracy_20'] for cat in results.keys()],
-        'Train Accuracy 50': [results[cat]['train_metrics']['accuracy_50'] for cat in results.keys()],
-        'Train Accuracy 100': [results[cat]['train_metrics']['accuracy_100'] for cat in results.keys()],
-        'Test RMSE': [results[cat]['test_metrics']['rmse'] for cat in results.keys()],
-        'Test MAPE': [results[cat]['test_metrics']['mape'] for cat in results.keys()],
-        'Test R2': [results[cat]['test_metrics']['r2'] for cat in results.keys()],
-        'CV RMSE': [results[cat]['best_score'] for cat in results.keys()],
-        'Test Accuracy 20': [results[cat]['test_metrics']['accuracy_20'] for cat in results.keys()],
-        'Test Accuracy 50': [results[cat]['test_metrics']['accuracy_50'] for cat in results.keys()],
-        'Test Accuracy 100': [results[cat]['test_metrics']['accuracy_100'] for cat in results.keys()]
-    })
-
-    return results, summary_df, residuals, best_models
-
-def ridge_train_log(df, categories, n_splits, ridge_params, random_state=42, date_split='2024-11-16'):
+    return results, summary_frame(results), residuals, best_models
+
+# Multi-output training
+
+def _column_rmse(y_true, y_pred, column):
+    """RMSE of one target column of a multi-output prediction"""
+    return np.sqrt(mean_squared_error(np.asarray(y_true)[:, column], np.asarray(y_pred)[:, column]))
+
+def xgb_multi_estimator(random_state, n_threads, multi_strategy='multi_output_tree'):
     """
-    Similar to ridge_train, but uses a TransformedTargetRegressor with log1p/expm1
-    so that the target is log-transformed during training.
+    Estimator factory for a single XGBoost model predicting every category.
+    With multi_output_tree each boosting round grows one tree with a vector leaf per category,
+    so the histograms and split search are shared by all the categories.
     """
-    
-    results = {}
-    residuals = {}
-    best_models  = {}
+    return xgb.XGBRegressor(random_state=random_state, n_jobs=n_threads, tree_method='hist',
+                            multi_strategy=multi_strategy)
 
-    transformer = FunctionTransformer(func=log_transform, inverse_func=inverse_log_transform)
+def xgb_train_multi_log(df, categories, n_splits, xgb_params, random_state=42, date_split='2024-11-16',
+                        multi_strategy='multi_output_tree', n_jobs=-1):
+    """
+    Similar to xgb_train_log, but fits one multi-output XGBoost model on every category jointly.
+    The grid search minimizes the mean RMSE of the categories and the CV RMSE of each category
+    is reported from the same folds.
 
-    for category in categories:
-        # Prepare data
-        X = df.drop(categories, axis=1)
-        y = df[category]
+    Returns:
+        Tuple of (results, summary_df, residuals, best_model); best_model predicts one column per
+        category in the order of `categories`
+    """
+    # Prepare data
+    X = df.drop(categories, axis=1)
+    Y = df[categories]
 
-        X_train = X[X.index <= date_split]
-        y_train = y[y.index <= date_split]
-        X_test = X[X.index > date_split]
-        y_test = y[y.index > date_split]
+    train_mask = X.index <= date_split
+    X_train, Y_train = X[train_mask], Y[train_mask]
+    X_test, Y_test = X[~train_mask], Y[~train_mask]
 
+    # Time series CV
+    tcsv = TimeSeriesSplit(n_splits=n_splits, test_size=14, gap=0)
 
-        # Time series CV
-        tcsv = TimeSeriesSplit(n_splits=n_splits, test_size=14, gap=0)
+    pipeline = log_target_pipeline(xgb_multi_estimator(random_state, 1, multi_strategy=multi_strategy))
 
-        scaler = StandardScaler()
-        pipeline = Pipeline([
-            ('scaler', scaler),
-            ('model', TransformedTargetRegressor(
-                regressor=Ridge(random_state=random_state),
-                transformer=transformer
-            ))
-        ])
+    # Mean RMSE over the categories for the selection plus the RMSE of each category
+    scoring = {'rmse': 'neg_root_mean_squared_error'}
+    scoring.update({category: make_scorer(_column_rmse, greater_is_better=False, column=i)
+                    for i, category in enumerate(categories)})
 
-        
-        grid_search = GridSearchCV(
-            estimator=pipeline,
-            param_grid=ridge_params,
-            scoring='neg_root_mean_squared_error',
-            cv=tcsv,
-            refit=True,
-            n_jobs=1,
-            verbose=False
-        )
-        
-       # Train the model with warnings suppressed
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=RuntimeWarning)
-            grid_search.fit(X_train, y_train)
-
-
-        y_pred_train = grid_search.predict(X_train)
-        y_pred_test = grid_search.predict(X_test)
-
-        # Evaluate metrics on original scale
-        train_metrics = {
-            'mse': mean_squared_error(y_train, y_pred_train),
-            'rmse': np.sqrt(mean_squared_error(y_train, y_pred_train)),
-            'mae': mean_absolute_error(y_train, y_pred_train),
-            'r2': r2_score(y_train, y_pred_train),
-            'mape': calculate_mape(y_train, y_pred_train),
-            'accuracy_20': accuracy_range(20, y_train, y_pred_train),
-            'accuracy_50': accuracy_range(50, y_train, y_pred_train),
-            'accuracy_100': accuracy_range(100, y_train, y_pred_train)
-        }
+    grid_search = GridSearchCV(
+        estimator=pipeline,
+        param_grid=xgb_params,
+        scoring=scoring,
+        cv=tcsv,
+        refit='rmse',
+        n_jobs=n_jobs,
+        verbose=False
+    )
 
-        test_metrics = {
-            'mse': mean_squared_error(y_test, y_pred_test),
-            'rmse': np.sqrt(mean_squared_error(y_test, y_pred_test)),
-            'mae': mean_absolute_error(y_test, y_pred_test),
-            'r2': r2_score(y_test, y_pred_test),
-            'mape': calculate_mape(y_test, y_pred_test),
-            'accuracy_20': accuracy_range(20, y_test, y_pred_test),
-            'accuracy_50': accuracy_range(50, y_test, y_pred_test),
-            'accuracy_100': accuracy_range(100, y_test, y_pred_test)
-        }
+    grid_search.fit(X_train, Y_train)
+
+    Y_pred_train = grid_search.predict(X_train).reshape(len(X_train), -1)
+    Y_pred_test = grid_search.predict(X_test).reshape(len(X_test), -1)
+
+    results = {}
+    residuals = {}
+    for i, category in enumerate(categories):
+        y_pred_train = pd.Series(Y_pred_train[:, i], index=X_train.index)
+        y_pred_test = pd.Series(Y_pred_test[:, i], index=X_test.index)
 
         results[category] = {
             'best_params': grid_search.best_params_,
-            'best_score': -grid_search.best_score_, 
-            'train_metrics': train_metrics,
-            'test_metrics': test_metrics
+            'best_score': -grid_search.cv_results_[f'mean_test_{category}'][grid_search.best_index_],
+            'train_metrics': regression_metrics(Y_train[category], y_pred_train),
+            'test_metrics': regression_metrics(Y_test[category], y_pred_test)
         }
 
         # Residuals in original scale
         residuals[category] = {
-            'train_residuals': y_train - y_pred_train,
-            'test_residuals': y_test - y_pred_test
+            'train_residuals': Y_train[category] - y_pred_train,
+            'test_residuals': Y_test[category] - y_pred_test
         }
-        
-        best_models[category] = grid_search.best_estimator_
-
-        print(f"\nMetrics for {category}:")
-        print("Training Metrics:")
-        print(f"RMSE: {train_metrics['rmse']:.4f}")
-        print(f"MAPE: {train_metrics['mape']:.4f}")
-        print(f"R2: {train_metrics['r2']:.4f}")
-        print("\nTest Metrics:")
-        print(f"RMSE: {test_metrics['rmse']:.4f}")
-        print(f"MAPE: {test_metrics['mape']:.4f}")
-        print(f"R2: {test_metrics['r2']:.4f}")
-
-    # Build summary DataFrame
-    summary_df = pd.DataFrame({
-        'Category': list(results.keys()),
-        'Train RMSE': [results[cat]['train_metrics']['rmse'] for cat in results.keys()],
-        'Train MAPE': [results[cat]['train_metrics']['mape'] for cat in results.keys()],
-        'Train R2': [results[cat]['train_metrics']['r2'] for cat in results.keys()],
-        'Train Accuracy 20': [results[cat]['train_metrics']['accuracy_20'] for cat in results.keys()],
-        'Train Accuracy 50': [results[cat]['train_metrics']['accuracy_50'] for cat in results.keys()],
-        'Train Accuracy 100': [results[cat]['train_metrics']['accuracy_100'] for cat in results.keys()],
-        'Test RMSE': [results[cat]['test_metrics']['rmse'] for cat in results.keys()],
-        'Test MAPE': [results[cat]['test_metrics']['mape'] for cat in results.keys()],
-        'Test R2': [results[cat]['test_metrics']['r2'] for cat in results.keys()],
-        'CV RMSE': [results[cat]['best_score'] for cat in results.keys()],
-        'Test Accuracy 20': [results[cat]['test_metrics']['accuracy_20'] for cat in results.keys()],
-        'Test Accuracy 50': [results[cat]['test_metrics']['accuracy_50'] for cat in results.keys()],
-        'Test Accuracy 100': [results[cat]['test_metrics']['accuracy_100'] for cat in results.keys()]
-    })
-
-    return results, summary_df, residuals, best_models
\ No newline at end of file
+
+        print_metrics(category, results[category]['train_metrics'], results[category]['test_metrics'])
+
+    return results, summary_frame(results), residuals, grid_search.best_estimator_
+
+# Incremental retraining
+
+def _continue_boosting(model, X, y, extra_rounds):
+    """
+    Copies a fitted log-target XGBoost pipeline and boosts extra_rounds more trees on (X, y) on top of its booster,
+    keeping the fitted scaler.
+    """
+    model = deepcopy(model)
+    scaler = model.named_steps['scaler']
+    target_model = model.named_steps['model']
+    regressor = clone(target_model.regressor_).set_params(n_estimators=extra_rounds)
+    y_log = target_model.transformer_.transform(y.to_numpy().reshape(-1, 1)).ravel()
+    regressor.fit(scaler.transform(X), y_log, xgb_model=target_model.regressor_.get_booster())
+    target_model.regressor_ = regressor
+
+    return model
+
+def incremental_retrain(model_path, df, category, new_start, holdout_days=14, mode='continue', extra_rounds=50,
+                        promote=True):
+    """
+    Updates a trained model with newly appended weeks instead of re-running the hyperparameter search.
+
+    Modes:
+        - 'continue': keeps the fitted scaler and continues boosting the current XGBoost model on the
+          appended rows for extra_rounds more trees
+        - 'refit': refits the current pipeline with its chosen hyperparameters on the history plus the
+          appended weeks (a refit on the appended weeks alone would fit the scaler on a handful of rows)
+
+    The last holdout_days appended days, which neither model has seen, are held out (at most all but one
+    appended day, so the candidate always learns from some new data). The candidate is built without them
+    and promoted (written over model_path) only if its holdout RMSE is not worse than the current model's;
+    the promoted model is then rebuilt the same way on every row, holdout included.
+
+    Args:
+        model_path: Path of the pickled dilled model in sales_models/
+        df: DataFrame with the model features and the target category, history plus the appended weeks
+        category: Target category column
+        new_start: First date of the appended weeks
+        holdout_days: Number of most recent appended days used to validate the candidate
+        mode: 'continue' or 'refit' (models other than XGBoost are always refit)
+        extra_rounds: Number of boosting rounds added in 'continue' mode
+        promote: Write the candidate over model_path when it passes the holdout check, with a lineage entry
+            pointing to the artifact of the replaced model
+
+    Returns:
+        Dict with the holdout RMSE of the current and candidate models, whether the candidate was
+        promoted and the candidate model
+
+    Raises:
+        ValueError: If df has fewer than two rows on or after new_start
+    """
+    with open(model_path, 'rb') as f:
+        current = dill.load(f)
+
+    # Features in the order the model was trained on
+    X = df[list(current.feature_names_in_)]
+    y = df[category]
+
+    new_mask = X.index >= new_start
+    new_dates = X.index[new_mask].sort_values()
+    if len(new_dates) < 2:
+        raise ValueError(f"Need at least two rows on or after new_start {new_start}, found {len(new_dates)}")
+    holdout_mask = X.index >= new_dates[-min(holdout_days, len(new_dates) - 1)]
+    X_holdout, y_holdout = X[holdout_mask], y[holdout_mask]
+
+    if mode == 'continue' and not _is_xgb(current):
+        print(f"{category}: continued boosting needs an XGBoost model, refitting instead")
+        mode = 'refit'
+
+    def build(mask):
+        # Candidate learning from the rows of the mask
+        if mode == 'continue':
+            return _continue_boosting(current, X[mask & new_mask], y[mask & new_mask], extra_rounds)
+        return clone(current).fit(X[mask], y[mask])
+
+    candidate = build(~holdout_mask)
+
+    current_rmse = np.sqrt(mean_squared_error(y_holdout, current.predict(X_holdout)))
+    candidate_rmse = np.sqrt(mean_squared_error(y_holdout, candidate.predict(X_holdout)))
+    promoted = promote and candidate_rmse <= current_rmse
+
+    if promoted:
+        candidate = build(np.ones(len(X), dtype=bool))
+        write_model(candidate, model_path)
+
+        # The served file now derives from its previous artifact and the appended data
+        parent = (read_lineage(model_path) or {}).get('artifact')
+        config = {'parent': parent, 'mode': mode, 'new_start': str(new_start), 'holdout_days': holdout_days,
+                  'extra_rounds': extra_rounds if mode == 'continue' else None}
+        record_lineage({os.path.basename(model_path): {
+            'artifact': artifact_key(df[list(X.columns) + [category]], X.columns, config),
+            'category': category, **config,
+            'date_range': [str(X.index.min()), str(X.index.max())],
+            'published': datetime.now().isoformat()
+        }}, os.path.dirname(model_path))
+
+    print(f"{category}: holdout RMSE {current_rmse:.4f} -> {candidate_rmse:.4f} ({'promoted' if promoted else 'kept current model'})")
+
+    return {
+        'category': category,
+        'mode': mode,
+        'current_rmse': current_rmse,
+        'candidate_rmse': candidate_rmse,
+        'promoted': promoted,
+        'model': candidate
+    }
+
+def incremental_retrain_all(df, model_paths, new_start, holdout_days=14, mode='continue', extra_rounds=50,
+                            promote=True):
+    """
+    Runs incremental_retrain for every category.
+
+    Args:
+        model_paths: Dict of category -> model path (e.g. forecast_pipeline.SALES_MODELS)
+
+    Returns:
+        DataFrame with the holdout RMSE of the current and candidate model of every category
+    """
+    reports = [incremental_retrain(path, df, category, new_start, holdout_days=holdout_days, mode=mode,
+                                   extra_rounds=extra_rounds, promote=promote)
+               for category, path in model_paths.items()]
+
+    return pd.DataFrame(reports).drop(columns='model')
@@ -0,0 +1,164 @@
+# Description: This file contains the global panel model of the item sales. Every (item, date) pair is one row of a
+# long-format panel with categorical item and category codes and the shared daily features (calendar, weather, macro),
+# and a single XGBoost hist model with native categorical splits is trained on every item at once.
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.compose import TransformedTargetRegressor
+from sklearn.preprocessing import FunctionTransformer
+from scripts.item_forecasting import CATEGORY_MAP, item_panel
+from scripts.model_training import log_transform, inverse_log_transform, regression_metrics, print_metrics
+
+# Panel columns that are not features
+TARGET = 'Net Sales'
+PANEL_KEYS = ['date']
+
+# Panel construction
+# ------------------------------------------------------------------------------
+def _panel_frame(item_codes, day_codes, items, categories, dates, features):
+    """
+    Assembles long panel rows from item and day codes.
+    Parameters:
+        item_codes (numpy.ndarray): Item code of every row
+        day_codes (numpy.ndarray): Row position of every row in features
+        items (list): Item names, indexed by item code
+        categories (numpy.ndarray): Model category of every item
+        dates (pandas.DatetimeIndex): The dates of the feature rows
+        features (pandas.DataFrame): The shared daily features
+    Returns:
+        pandas.DataFrame: 'date', categorical 'item' and 'category' columns and float32 features
+    """
+    category_index = pd.Index(sorted(set(categories)))
+    item_categories = category_index.get_indexer(categories)
+
+    frame = pd.DataFrame({
+        'date': dates[day_codes],
+        'item': pd.Categorical.from_codes(item_codes, categories=items),
+        'category': pd.Categorical.from_codes(item_categories[item_codes], categories=category_index)
+    })
+    shared = features.to_numpy(dtype=np.float32)[day_codes]
+    return pd.concat([frame, pd.DataFrame(shared, columns=features.columns)], axis=1)
+
+
+def build_panel(items, features, category_map=CATEGORY_MAP) -> pd.DataFrame:
+    """
+    Builds the long-format training panel: one row per item and day from the first day the item was sold.
+    Parameters:
+        items (pandas.DataFrame): Item sales rows (output of item_sales_csv_fetch / merge_all_sales)
+        features (pandas.DataFrame): Shared daily features (calendar, weather, macro) indexed by date,
+                                     e.g. the category training frame without the category columns
+        category_map (dict): POS category -> model category, see item_forecasting.CATEGORY_MAP
+    Returns:
+        pandas.DataFrame: The panel rows with the float32 'Net Sales' target, ordered by date
+    """
+    panel = item_panel(items, category_map)
+    features = features.sort_index()
+    days = pd.DatetimeIndex(features.index).get_indexer(panel['dates'])
+    known = days >= 0
+
+    # Items enter the panel on their first sale, days without a sale before that are not zeros
+    sales = panel['sales'][known]
+    launched = np.maximum.accumulate(sales != 0, axis=0)
+    day_rows, item_codes = np.nonzero(launched)
+
+    frame = _panel_frame(item_codes, days[known][day_rows], panel['items'], panel['categories'],
+                         pd.DatetimeIndex(features.index), features)
+    frame[TARGET] = sales[day_rows, item_codes]
+
+    return frame
+
+
+def future_panel(panel, features) -> pd.DataFrame:
+    """
+    Builds the panel rows to forecast: every item of a training panel on every date of the future features.
+    Parameters:
+        panel (pandas.DataFrame): The training panel from build_panel
+        features (pandas.DataFrame): The shared features of the forecasted dates, indexed by date
+    Returns:
+        pandas.DataFrame: The (dates x items) rows without the target
+    """
+    items = list(panel['item'].cat.categories)
+    categories = (panel.drop_duplicates('item').set_index('item')['category'].astype(str)
+                  .reindex(items).to_numpy())
+    day_codes = np.repeat(np.arange(len(features)), len(items))
+    item_codes = np.tile(np.arange(len(items)), len(features))
+
+    return _panel_frame(item_codes, day_codes, items, categories, pd.DatetimeIndex(features.index), features)
+
+# Training
+# ------------------------------------------------------------------------------
+def panel_estimator(random_state=42, n_jobs=-1, **params):
+    """
+    Global XGBoost model of the log1p item sales, with native categorical splits on the item and category codes.
+    """
+    regressor = xgb.XGBRegressor(tree_method='hist', enable_categorical=True, max_cat_to_onehot=1,
+                                 random_state=random_state, n_jobs=n_jobs, **params)
+    transformer = FunctionTransformer(func=log_transform, inverse_func=inverse_log_transform)
+
+    return TransformedTargetRegressor(regressor=regressor, transformer=transformer)
+
+
+def train_panel_model(panel, date_split='2024-11-16', params=None, random_state=42, n_jobs=-1, verbose=True):
+    """
+    Trains one global model on every item of a panel.
+
+    Args:
+        panel: The long-format panel from build_panel
+        date_split: Last date of the training set
+        params: XGBRegressor parameters (n_estimators, max_depth, learning_rate, ...)
+        random_state: Seed of the model
+        n_jobs: Number of XGBoost threads
+        verbose: Print the item-level and category-level metrics
+
+    Returns:
+        Tuple of (model, results, predictions): results holds the item-level 'train_metrics' and 'test_metrics'
+        and the 'category_metrics' of the item forecasts summed per category and day; predictions are the
+        test rows with a 'Prediction' column
+    """
+    feature_columns = [col for col in panel.columns if col not in PANEL_KEYS + [TARGET]]
+    train_mask = (panel['date'] <= date_split).to_numpy()
+    X_train, X_test = panel.loc[train_mask, feature_columns], panel.loc[~train_mask, feature_columns]
+    y_train = panel.loc[train_mask, TARGET].clip(lower=0)
+    y_test = panel.loc[~train_mask, TARGET]
+
+    model = panel_estimator(random_state, n_jobs, **(params or {}))
+    model.fit(X_train, y_train.to_numpy(dtype=float))
+
+    y_pred_train = model.predict(X_train)
+    y_pred_test = model.predict(X_test)
+
+    predictions = panel.loc[~train_mask, ['date', 'item', 'category', TARGET]].assign(Prediction=y_pred_test)
+    category_totals = predictions.groupby(['date', 'category'], observed=True)[[TARGET, 'Prediction']].sum()
+    category_metrics = {category: regression_metrics(totals[TARGET], totals['Prediction'])
+                        for category, totals in category_totals.groupby(level='category', observed=True)}
+
+    results = {
+        'train_metrics': regression_metrics(y_train, y_pred_train),
+        'test_metrics': regression_metrics(y_test, y_pred_test),
+        'category_metrics': category_metrics
+    }
+
+    if verbose:
+        print_metrics('every item', results['train_metrics'], results['test_metrics'])
+        for category, metrics in category_metrics.items():
+            print(f"{category} daily total - Test RMSE: {metrics['rmse']:.4f}, Test MAPE: {metrics['mape']:.4f}")
+
+    return model, results, predictions
+
+
+def forecast_panel(model, panel, features) -> pd.DataFrame:
+    """
+    Forecasts every item of a panel on the dates of the future features.
+    Parameters:
+        model: The model from train_panel_model
+        panel (pandas.DataFrame): The training panel
+        features (pandas.DataFrame): The shared features of the forecasted dates, indexed by date
+    Returns:
+        pandas.DataFrame: The (dates x items) sales forecasts
+    """
+    rows = future_panel(panel, features)
+    feature_columns = [col for col in panel.columns if col not in PANEL_KEYS + [TARGET]]
+    rows['Prediction'] = np.maximum(model.predict(rows[feature_columns]), 0)
+
+    return rows.pivot(index='date', columns='item', values='Prediction')
@@ -0,0 +1,129 @@
+# Description: This file contains the offline job that precomputes the forecasts of every origin date in the valid
+# forecast window so the dashboard can read them from a table instead of running the pipeline live.
+
+import os
+import pandas as pd
+from scripts import forecast_pipeline as fp
+
+# Window of origin dates with valid feature data (see README)
+FORECAST_WINDOW = ('2024-12-01', '2025-01-21')
+
+# Scenarios precomputed for every origin date
+DEFAULT_SCENARIOS = {
+    'default': {'ped_start': '2025-06-01', 'ped_end': '2025-06-10', 'closed_dates': None}
+}
+
+FORECAST_TABLE_PATH = os.path.join('data', 'forecast_table.parquet')
+
+# Precompute job
+# ------------------------------------------------------------------------------
+def precompute_forecasts(start_date=FORECAST_WINDOW[0], end_date=FORECAST_WINDOW[1], scenarios=DEFAULT_SCENARIOS,
+                         output_path=FORECAST_TABLE_PATH) -> pd.DataFrame:
+    """
+    Runs the forecast pipeline for every origin date and scenario and stores the predictions.
+    Parameters:
+        start_date (str): First origin date in 'YYYY-MM-DD' format
+        end_date (str): Last origin date in 'YYYY-MM-DD' format
+        scenarios (dict): Scenario name -> forecast_pipe arguments (ped_start, ped_end, closed_dates)
+        output_path (str): Path of the parquet table, not written if None
+    Returns:
+        pandas.DataFrame: Predictions indexed by (scenario, origin, date) with one float32 column per category
+    """
+    # Load every model once for the whole job
+    models = {category: fp.load_sales_model(path) for category, path in fp.SALES_MODELS.items()}
+
+    forecasts = []
+    for origin in pd.date_range(start_date, end_date, freq='D').strftime('%Y-%m-%d'):
+        for name, scenario in scenarios.items():
+            try:
+                X, dates = fp.forecast_matrix(origin, scenario['ped_start'], scenario['ped_end'],
+                                              closed_dates=scenario['closed_dates'])
+                predictions = pd.DataFrame({category: fp.predict_matrix(model, X)
+                                            for category, model in models.items()}, index=dates)
+            except Exception as e:
+                print(f"Error precomputing {name} forecast for {origin}: {e}")
+                continue
+
+            predictions = predictions.assign(scenario=name, origin=pd.Timestamp(origin))
+            forecasts.append(predictions.rename_axis('date').reset_index())
+
+    if not forecasts:
+        return None
+
+    table = pd.concat(forecasts, ignore_index=True)
+    table['scenario'] = table['scenario'].astype('category')
+    table = table.astype({category: 'float32' for category in models})
+    table = table.set_index(['scenario', 'origin', 'date']).sort_index()
+
+    if output_path is not None:
+        table.to_parquet(output_path)
+        print(f"Saved {len(table)} precomputed forecast rows to {output_path}")
+
+    return table
+
+# Dashboard lookups
+# ------------------------------------------------------------------------------
+def load_forecast_table(path=FORECAST_TABLE_PATH) -> pd.DataFrame:
+    """
+    Loads the precomputed forecast table.
+    Parameters:
+        path (str): Path of the parquet table
+    Returns:
+        pandas.DataFrame: The precomputed forecasts or None if the table has not been built
+    """
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def scenario_name(ped_start, ped_end, closed_dates=None, scenarios=DEFAULT_SCENARIOS):
+    """
+    Finds the precomputed scenario matching the forecast inputs.
+    Parameters:
+        ped_start (str): Pedestrianization start date in 'YYYY-MM-DD' format
+        ped_end (str): Pedestrianization end date in 'YYYY-MM-DD' format
+        closed_dates (list, optional): Dates when the store is closed
+        scenarios (dict): Scenario name -> forecast_pipe arguments
+    Returns:
+        str: The scenario name or None if the inputs are not a precomputed scenario
+    """
+    closed_dates = sorted(closed_dates) if closed_dates else None
+    for name, scenario in scenarios.items():
+        scenario_closed = sorted(scenario['closed_dates']) if scenario['closed_dates'] else None
+        if (scenario['ped_start'], scenario['ped_end'], scenario_closed) == (ped_start, ped_end, closed_dates):
+            return name
+    return None
+
+
+def lookup_forecast(table, origin, scenario='default') -> pd.DataFrame:
+    """
+    Reads the precomputed forecast of an origin date.
+    Parameters:
+        table (pandas.DataFrame): The precomputed forecast table
+        origin (str): The forecast origin date in 'YYYY-MM-DD' format
+        scenario (str): The scenario name
+    Returns:
+        pandas.DataFrame: The (days x categories) predictions indexed by date or None if not precomputed
+    """
+    if table is None or scenario is None:
+        return None
+    try:
+        predictions = table.loc[(scenario, pd.Timestamp(origin))]
+    except KeyError:
+        return None
+
+    predictions = predictions.astype('float64')
+    predictions.index = predictions.index.date
+    return predictions
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Precompute the dashboard forecasts of the valid forecast window.')
+    parser.add_argument('--start', default=FORECAST_WINDOW[0], help='First origin date (YYYY-MM-DD)')
+    parser.add_argument('--end', default=FORECAST_WINDOW[1], help='Last origin date (YYYY-MM-DD)')
+    parser.add_argument('--output', default=FORECAST_TABLE_PATH, help='Path of the parquet table')
+    args = parser.parse_args()
+
+    precompute_forecasts(args.start, args.end, output_path=args.output)
@@ -0,0 +1,233 @@
+# Description: This file contains the pre-aggregated item sales cube. The sums of 'Sold' and 'Net Sales' are kept at the
+# (day, item), (day, category), (week, category) and (month, category) levels, updated incrementally as item exports
+# are ingested, stored as one parquet file per level, and rollup queries are answered from the smallest level that
+# holds the requested grain.
+
+import os
+import pandas as pd
+
+CUBE_PATH = os.path.join('data', 'sales_cube')
+MEASURES = ['Sold', 'Net Sales']
+
+# Levels from the finest to the coarsest: name -> (period, dimension)
+LEVELS = {
+    'day_item': ('day', 'item'),
+    'day_category': ('day', 'category'),
+    'week_category': ('week', 'category'),
+    'month_category': ('month', 'category')
+}
+
+# Period helpers
+# ------------------------------------------------------------------------------
+def _period_start(dates, period):
+    """
+    Maps dates to the first day of their period.
+    Parameters:
+        dates (pandas.Series): Dates
+        period (str): 'day', 'week' (weeks start on Monday) or 'month'
+    Returns:
+        pandas.Series: The period start dates
+    """
+    dates = pd.to_datetime(dates).dt.normalize()
+    if period == 'week':
+        return dates - pd.to_timedelta(dates.dt.dayofweek, unit='D')
+    if period == 'month':
+        return dates - pd.to_timedelta(dates.dt.day - 1, unit='D')
+    return dates
+
+
+def _rollup(df, period, dimension):
+    """
+    Sums the measures of finer cube rows (or raw item rows) by period and dimension.
+    Parameters:
+        df (pandas.DataFrame): Rows with a 'day' column, the dimension column and the measures
+        period (str): The period of the output level
+        dimension (str): 'item' or 'category'
+    Returns:
+        pandas.DataFrame: The aggregated level
+    """
+    keys = {period: _period_start(df['day'], period), dimension: df[dimension]}
+    grouped = df[MEASURES].groupby([keys[period], keys[dimension]], observed=True, sort=True).sum()
+    level = grouped.rename_axis([period, dimension]).reset_index()
+    level[dimension] = level[dimension].astype('category')
+
+    return level
+
+# Build and update
+# ------------------------------------------------------------------------------
+def _day_item(items):
+    """
+    Aggregates raw item rows (output of merge_all_sales on the item exports) to the (day, item) level.
+    """
+    rows = pd.DataFrame({
+        'day': pd.to_datetime(items['date']).dt.normalize(),
+        'item': items['Name'].astype(str),
+        'category': items['Category Name'].astype(str),
+        'Sold': items['Sold'].astype('float64'),
+        'Net Sales': items['Net Sales'].astype('float64')
+    })
+
+    # An item keeps the category it was sold under on that day
+    level = rows.groupby(['day', 'item'], sort=True).agg(
+        {'category': 'last', 'Sold': 'sum', 'Net Sales': 'sum'}
+    ).reset_index()
+
+    return level.astype({'item': 'category', 'category': 'category'})
+
+
+def _derived_levels(day_item):
+    """
+    Builds the category levels from the (day, item) level.
+    """
+    day_category = _rollup(day_item, 'day', 'category')
+    return {
+        'day_category': day_category,
+        'week_category': _rollup(day_category, 'week', 'category'),
+        'month_category': _rollup(day_category, 'month', 'category')
+    }
+
+
+def build_cube(items) -> dict:
+    """
+    Builds every level of the cube from item sales rows.
+    Parameters:
+        items (pandas.DataFrame): Item rows with 'date', 'Name', 'Category Name', 'Sold' and 'Net Sales'
+    Returns:
+        dict: Level name -> aggregated DataFrame
+    """
+    day_item = _day_item(items)
+    return {'day_item': day_item, **_derived_levels(day_item)}
+
+
+def update_cube(cube, items) -> dict:
+    """
+    Ingests new item rows. The days of the new rows replace the stored days, so re-ingesting an export is
+    idempotent, and only the weeks and months that contain those days are re-aggregated.
+    Parameters:
+        cube (dict): The current cube (from build_cube or load_cube), None for an empty cube
+        items (pandas.DataFrame): The new item rows
+    Returns:
+        dict: The updated cube
+    """
+    if not cube:
+        return build_cube(items)
+
+    new_day_item = _day_item(items)
+    days = new_day_item['day'].unique()
+    day_item = pd.concat([cube['day_item'][~cube['day_item']['day'].isin(days)].astype({'item': str, 'category': str}),
+                          new_day_item.astype({'item': str, 'category': str})], ignore_index=True)
+    day_item = day_item.sort_values(['day', 'item'], ignore_index=True).astype({'item': 'category',
+                                                                                'category': 'category'})
+
+    updated = {'day_item': day_item}
+    affected_days = day_item[day_item['day'].isin(days)]
+    day_category = pd.concat([
+        cube['day_category'][~cube['day_category']['day'].isin(days)].astype({'category': str}),
+        _rollup(affected_days, 'day', 'category').astype({'category': str})
+    ], ignore_index=True).sort_values(['day', 'category'], ignore_index=True)
+    updated['day_category'] = day_category.astype({'category': 'category'})
+
+    for name in ['week_category', 'month_category']:
+        period, dimension = LEVELS[name]
+        periods = _period_start(pd.Series(days), period).unique()
+        affected = day_category[_period_start(day_category['day'], period).isin(periods)]
+        level = pd.concat([
+            cube[name][~cube[name][period].isin(periods)].astype({dimension: str}),
+            _rollup(affected, period, dimension).astype({dimension: str})
+        ], ignore_index=True).sort_values([period, dimension], ignore_index=True)
+        updated[name] = level.astype({dimension: 'category'})
+
+    return updated
+
+# Storage
+# ------------------------------------------------------------------------------
+def save_cube(cube, path=CUBE_PATH):
+    """
+    Stores every level of the cube as a parquet file.
+    Parameters:
+        cube (dict): The cube
+        path (str): The cube directory
+    """
+    os.makedirs(path, exist_ok=True)
+    for name, level in cube.items():
+        level.to_parquet(os.path.join(path, f'{name}.parquet'), index=False)
+
+
+def load_cube(path=CUBE_PATH, levels=None) -> dict:
+    """
+    Loads the stored cube levels.
+    Parameters:
+        path (str): The cube directory
+        levels (list, optional): Level names to load, every level by default
+    Returns:
+        dict: Level name -> aggregated DataFrame, None if the cube has not been built
+    """
+    if not os.path.exists(os.path.join(path, 'day_item.parquet')):
+        return None
+    return {name: pd.read_parquet(os.path.join(path, f'{name}.parquet')) for name in (levels or LEVELS)}
+
+# Queries
+# ------------------------------------------------------------------------------
+def _aligned(start, end, period):
+    """Whether a [start, end] date range covers whole periods"""
+    if period == 'day':
+        return True
+    start_ok = start is None or _period_start(pd.Series([start]), period).iloc[0] == pd.Timestamp(start)
+    next_day = None if end is None else pd.Timestamp(end) + pd.Timedelta(days=1)
+    end_ok = end is None or _period_start(pd.Series([next_day]), period).iloc[0] == next_day
+    return start_ok and end_ok
+
+
+def query_level(freq, by, start=None, end=None):
+    """
+    Chooses the smallest cube level able to answer a query.
+    Parameters:
+        freq (str): 'day', 'week' or 'month'
+        by (str): 'item', 'category' or None for the total
+        start (str, optional): First date of the query
+        end (str, optional): Last date of the query
+    Returns:
+        str: The level name
+    """
+    if by == 'item':
+        return 'day_item'
+    for name in ['month_category', 'week_category', 'day_category']:
+        period = LEVELS[name][0]
+        # A coarser level answers its own grain when the date range covers whole periods
+        if period == freq and _aligned(start, end, period):
+            return name
+    return 'day_category'
+
+
+def query(cube, freq='day', by='category', start=None, end=None, values=None) -> pd.DataFrame:
+    """
+    Answers a rollup query from the smallest sufficient cube level.
+    Parameters:
+        cube (dict): The cube
+        freq (str): 'day', 'week' or 'month'
+        by (str): 'item', 'category' or None for the total
+        start (str, optional): First date of the query in 'YYYY-MM-DD' format
+        end (str, optional): Last date of the query in 'YYYY-MM-DD' format
+        values (list, optional): Items or categories kept in the result
+    Returns:
+        pandas.DataFrame: The measures indexed by period start (and item or category)
+    """
+    name = query_level(freq, by, start, end)
+    level = cube[name]
+    period = LEVELS[name][0]
+
+    # Filter on the day dates of the finer levels, on the period starts of the aligned coarser ones
+    mask = pd.Series(True, index=level.index)
+    if start is not None:
+        mask &= level[period] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= level[period] <= pd.Timestamp(end)
+    if values is not None and by is not None:
+        mask &= level[by].isin(values)
+    rows = level[mask]
+
+    keys = [_period_start(rows[period], freq).rename(freq)]
+    if by is not None:
+        keys.append(rows[by].astype(str))
+
+    return rows[MEASURES].groupby(keys, sort=True).sum()
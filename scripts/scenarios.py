@@ -0,0 +1,144 @@
+# Description: This file contains the what-if scenario engine. The 10-day feature matrix is built once per origin date,
+# closures, pedestrianization windows and other overrides are applied to stacked copies of it, and every scenario is
+# scored with a single batched predict per category.
+
+import numpy as np
+import pandas as pd
+from scripts import forecast_pipeline as fp
+
+# Feature matrix
+# ------------------------------------------------------------------------------
+def base_features(date, ped_start=None, ped_end=None) -> pd.DataFrame:
+    """
+    Fetches and builds the feature matrix shared by every scenario of an origin date.
+    Parameters:
+        date (str): The current date in 'YYYY-MM-DD' format
+        ped_start (str, optional): Start date for pedestrianization in 'YYYY-MM-DD' format
+        ped_end (str, optional): End date for pedestrianization in 'YYYY-MM-DD' format
+    Returns:
+        pandas.DataFrame: The features of the next 10 days with the store open
+    """
+    X, dates = fp.forecast_matrix(date, ped_start, ped_end, closed_dates=None)
+    return pd.DataFrame(X, index=dates, columns=fp.FEATURE_ORDER)
+
+
+def _date_mask(index, dates):
+    """
+    Flags the rows of a date index that fall in a list of dates.
+    Parameters:
+        index (pandas.DatetimeIndex): The feature matrix index
+        dates (list): Dates in 'YYYY-MM-DD' format
+    Returns:
+        numpy.ndarray: Boolean mask over the index
+    """
+    if not dates:
+        return np.zeros(len(index), dtype=bool)
+    return index.isin(pd.to_datetime(list(dates)))
+
+
+def _stack_scenarios(base, scenarios):
+    """
+    Stacks one float32 copy of the base features per scenario and applies the scenario overrides.
+    Parameters:
+        base (pandas.DataFrame): The base feature matrix from base_features
+        scenarios (dict): Scenario name -> scenario definition (see build_scenario_matrix)
+    Returns:
+        numpy.ndarray: The (scenarios * days x features) stacked features
+        pandas.MultiIndex: The (scenario, date) index of the stacked rows
+    Raises:
+        ValueError: If a scenario overrides an interaction feature.
+    """
+    names = list(scenarios)
+    n_days = len(base)
+    dates = pd.DatetimeIndex(base.index)
+    columns = {col: i for i, col in enumerate(base.columns)}
+
+    # (scenarios x days x features) copy of the base matrix
+    stacked = np.repeat(base.to_numpy(dtype=np.float32)[np.newaxis], len(names), axis=0)
+
+    for s, name in enumerate(names):
+        scenario = scenarios[name]
+
+        closed = _date_mask(dates, scenario.get('closed_dates'))
+        stacked[s, closed, columns['closed']] = 1
+
+        if scenario.get('ped_start') is not None and scenario.get('ped_end') is not None:
+            stacked[s, :, columns['is_pedestrian']] = (dates >= scenario['ped_start']) & (dates <= scenario['ped_end'])
+
+        overrides = scenario.get('overrides', {})
+        derived = set(overrides).intersection(fp.INTERACTIONS)
+        if derived:
+            raise ValueError(f"Scenario {name} overrides derived features {sorted(derived)}, "
+                             f"override their source columns instead")
+        for col, value in overrides.items():
+            if isinstance(value, dict):
+                for day, day_value in value.items():
+                    stacked[s, _date_mask(dates, [day]), columns[col]] = day_value
+            else:
+                stacked[s, :, columns[col]] = value
+
+        # Keep the interactions consistent with the overridden source columns
+        for col, (left, right) in fp.INTERACTIONS.items():
+            if col in columns and (left in overrides or right in overrides):
+                stacked[s, :, columns[col]] = stacked[s, :, columns[left]] * stacked[s, :, columns[right]]
+
+    index = pd.MultiIndex.from_product([names, dates], names=['scenario', 'date'])
+    return stacked.reshape(len(names) * n_days, -1), index
+
+
+def build_scenario_matrix(base, scenarios) -> pd.DataFrame:
+    """
+    Stacks one copy of the base features per scenario and applies the scenario overrides.
+    Each scenario is a dict that may contain:
+        - closed_dates (list): Dates when the store is closed
+        - ped_start, ped_end (str): Pedestrianization window replacing the base 'is_pedestrian' flags
+        - overrides (dict): Column -> scalar for every day, or dict of date -> value; interaction features
+          (see forecast_pipeline.INTERACTIONS) are recomputed from their overridden sources and cannot be overridden
+    Parameters:
+        base (pandas.DataFrame): The base feature matrix from base_features
+        scenarios (dict): Scenario name -> scenario definition
+    Returns:
+        pandas.DataFrame: The stacked features indexed by (scenario, date)
+    """
+    stacked, index = _stack_scenarios(base, scenarios)
+    return pd.DataFrame(stacked, index=index, columns=base.columns)
+
+# Scoring
+# ------------------------------------------------------------------------------
+def score_scenarios(base, scenarios, models=None) -> pd.DataFrame:
+    """
+    Forecasts every scenario with one predict call per category.
+    Parameters:
+        base (pandas.DataFrame): The base feature matrix from base_features
+        scenarios (dict): Scenario name -> scenario definition (see build_scenario_matrix)
+        models (dict, optional): Category -> loaded model, loaded from SALES_MODELS if None
+    Returns:
+        pandas.DataFrame: Forecasted sales indexed by (scenario, date) with one column per category
+    """
+    if models is None:
+        models = {category: fp.load_sales_model(path) for category, path in fp.SALES_MODELS.items()}
+
+    stacked, index = _stack_scenarios(base[fp.FEATURE_ORDER], scenarios)
+    predictions = pd.DataFrame({category: fp.predict_matrix(model, stacked) for category, model in models.items()},
+                               index=index)
+
+    return predictions
+
+
+def compare_scenarios(predictions, baseline=None) -> pd.DataFrame:
+    """
+    Summarizes the total sales of each scenario over the forecast horizon.
+    Parameters:
+        predictions (pandas.DataFrame): Output of score_scenarios
+        baseline (str, optional): Scenario the others are compared against
+    Returns:
+        pandas.DataFrame: Total sales per scenario and category, with the difference to the baseline if given
+    """
+    totals = predictions.groupby(level='scenario', sort=False).sum()
+    totals['Total'] = totals.sum(axis=1)
+
+    if baseline is not None:
+        difference = totals - totals.loc[baseline]
+        totals = totals.join(difference.add_suffix(' vs baseline'))
+
+    return totals
@@ -0,0 +1,189 @@
+# Description: This file contains lightweight per-stage tracing for the forecast pipeline: spans recording wall time,
+# cache hit/miss and rows produced, and exporters writing them as JSON lines or Prometheus text format.
+
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Spans of the active trace (None when no trace is running)
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+# Innermost running span
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+# Functions called with the spans of every finished trace
+_exporters = []
+
+# Traces
+# ------------------------------------------------------------------------------
+def start_trace(name='forecast'):
+    """
+    Starts collecting the spans of a new trace in the current context.
+    Parameters:
+        name (str): Name of the trace
+    Returns:
+        str: The trace id
+    """
+    trace_id = f"{name}-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}"
+    _current_trace.set({'trace_id': trace_id, 'spans': []})
+    return trace_id
+
+
+def end_trace() -> list:
+    """
+    Stops the current trace and sends its spans to the registered exporters.
+    Returns:
+        list: The span records of the trace
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return []
+    _current_trace.set(None)
+
+    for exporter in _exporters:
+        try:
+            exporter(trace['spans'])
+        except Exception as e:
+            print(f"Error exporting trace {trace['trace_id']}: {e}")
+
+    return trace['spans']
+
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    Times a pipeline stage. The yielded record can be updated with 'cache' ('hit'/'miss') and 'rows'.
+    The span is only kept when a trace is running.
+    Parameters:
+        stage (str): Name of the stage
+        **attributes: Extra attributes stored with the span
+    Yields:
+        dict: The span record
+    """
+    trace = _current_trace.get()
+    record = {'trace_id': trace['trace_id'] if trace else None,
+              'stage': stage,
+              'start': datetime.now().isoformat(),
+              'wall_time': None,
+              'cache': None,
+              'rows': None,
+              **attributes}
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['wall_time'] = time.perf_counter() - start
+        _current_span.reset(token)
+        if trace is not None:
+            trace['spans'].append(record)
+
+
+def annotate(**attributes):
+    """
+    Updates the innermost running span, e.g. annotate(cache='hit') from inside a fetch function.
+    Parameters:
+        **attributes: Attributes stored with the span
+    """
+    record = _current_span.get()
+    if record is not None:
+        record.update(attributes)
+
+# Exporters
+# ------------------------------------------------------------------------------
+def register_exporter(exporter):
+    """
+    Registers a function called with the list of spans of every finished trace.
+    Parameters:
+        exporter (callable): The exporter function
+    """
+    if exporter not in _exporters:
+        _exporters.append(exporter)
+
+
+def clear_exporters():
+    """Removes every registered exporter."""
+    _exporters.clear()
+
+
+def jsonl_exporter(path):
+    """
+    Creates an exporter appending one JSON line per span to a file.
+    Parameters:
+        path (str): Path of the JSON lines file
+    Returns:
+        callable: The exporter function
+    """
+    def export(spans):
+        with open(path, 'a', encoding='utf-8') as file:
+            for record in spans:
+                file.write(json.dumps(record, default=str) + '\n')
+
+    return export
+
+
+def span_totals(spans, totals=None) -> dict:
+    """
+    Adds the wall time, calls and rows of spans to running totals by stage and cache status.
+    Parameters:
+        spans (list): The span records
+        totals (dict, optional): The running totals, updated in place, new totals if None
+    Returns:
+        dict: (stage, cache) -> (seconds, calls, rows)
+    """
+    totals = {} if totals is None else totals
+    for record in spans:
+        labels = (record['stage'], record['cache'] or 'none')
+        seconds, calls, rows = totals.get(labels, (0.0, 0, 0))
+        totals[labels] = (seconds + record['wall_time'], calls + 1, rows + (record['rows'] or 0))
+
+    return totals
+
+
+def prometheus_text(spans=None, totals=None) -> str:
+    """
+    Formats spans in the Prometheus text exposition format, aggregated by stage and cache status.
+    Parameters:
+        spans (list, optional): The span records
+        totals (dict, optional): Running totals from span_totals, used instead of spans
+    Returns:
+        str: The metrics text
+    """
+    totals = span_totals(spans or []) if totals is None else totals
+
+    metrics = [('forecast_stage_seconds_total', 'Wall time spent in each forecast pipeline stage.', 0),
+               ('forecast_stage_calls_total', 'Number of runs of each forecast pipeline stage.', 1),
+               ('forecast_stage_rows_total', 'Rows produced by each forecast pipeline stage.', 2)]
+    lines = []
+    for name, description, position in metrics:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} counter')
+        for (stage, cache), values in totals.items():
+            lines.append(f'{name}{{stage="{stage}",cache="{cache}"}} {values[position]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def prometheus_exporter(path):
+    """
+    Creates an exporter writing the totals of every trace exported since it was created in Prometheus text format
+    (e.g. for a node exporter textfile collector). The counters only grow while the process runs.
+    Parameters:
+        path (str): Path of the metrics file
+    Returns:
+        callable: The exporter function
+    """
+    totals = {}
+
+    def export(spans):
+        span_totals(spans, totals)
+        # Write then rename so collectors never read a partial file
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(prometheus_text(totals=totals))
+        os.replace(tmp_path, path)
+
+    return export
@@ -412,3 +412,34 @@ def plot_total_sales(total_df, coffee_contribution, without_coffee_contribution,
     plt.tight_layout()
     plt.show()
 
+
+
+def plot_feature_importance(importance):
+    """
+    Plots the feature importance of every category without blocking, from attribution.feature_importance.
+
+    Parameters:
+    importance (pd.DataFrame): The 'feature', 'importance' and 'category' rows.
+
+    Returns:
+    seaborn.FacetGrid: The figure grid, shown by the caller (plt.show) or saved (g.savefig).
+    """
+    importance = importance.astype({'category': str, 'feature': str})
+    g = sns.catplot(
+        data=importance,
+        y='feature',
+        x='importance',
+        col='category',
+        kind='bar',
+        col_wrap=3,
+        height=7,
+        aspect=1,
+        sharex=False,
+        sharey=False,
+        palette='viridis',
+        hue='feature'
+    )
+    g.fig.suptitle('Feature Importance by Category (including Overall)', y=1.02)
+    plt.tight_layout()
+
+    return g